@@ -1,12 +1,10 @@
 import os
 from flask import Flask
 from config import config
-from extensions import db, migrate, mail
+from extensions import db
 from datetime import datetime, timezone, timedelta
 from flask_wtf import CSRFProtect
 from flask_login import LoginManager
-from apscheduler.schedulers.background import BackgroundScheduler
-import atexit
 
 csrf = CSRFProtect()
 login_manager = LoginManager()
@@ -15,9 +13,6 @@ login_manager.login_view = 'main_bp.signin'
 login_manager.login_message_category = 'info'
 login_manager.login_message = 'Please log in to access this page.'
 
-# Initialize scheduler globally, but start it within app context
-scheduler = BackgroundScheduler()
-
 def create_app(config_name=None):
     if config_name is None:
         config_name = os.environ.get('FLASK_CONFIG', 'default')
@@ -36,47 +31,48 @@ def create_app(config_name=None):
 
     # Initialize Flask extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    from . import database
+    database.init_app(app)
+    from . import replica
+    replica.init_app(app)
+    from . import metrics
+    metrics.init_app(app)
     csrf.init_app(app)
     login_manager.init_app(app)
-    mail.init_app(app)
 
-    # User loader callback for Flask-Login
-    from .models import User
+    # User loader callback for Flask-Login, served from the identity cache
+    from .cache import init_user_cache, init_page_cache, load_cached_user
+    init_user_cache(app)
+    init_page_cache(app)
+    from . import events
+    events.init_app(app)
     @login_manager.user_loader
     def load_user(user_id):
         if user_id is not None:
-            return db.session.get(User, int(user_id))
+            return load_cached_user(int(user_id))
         return None
 
     # Register blueprints
     from .routes import main_bp
     app.register_blueprint(main_bp)
+    from .api import api_bp
+    csrf.exempt(api_bp)  # JSON-only, see app/api.py
+    login_manager.blueprint_login_views[api_bp.name] = None  # 401 instead of a redirect to the sign-in page
+    app.register_blueprint(api_bp)
+
+    # Register CLI commands
+    from . import cli
+    cli.init_app(app)
 
     # Inject current year into templates
     @app.context_processor
     def inject_now():
         return {'now_year': datetime.now(timezone.utc).year}
 
-    # Start the scheduler only once when the app is created
-    if not scheduler.running:
-        # Import tasks here to avoid circular imports
-        from .tasks import send_due_date_reminders
-
-        # Add the job to the scheduler
-        scheduler.add_job(
-            func=lambda: send_due_date_reminders(app), # Pass the app instance
-            trigger='cron',
-            hour=0, # Run at 0 AM UTC
-            minute=0,
-            id='due_date_reminders',
-            replace_existing=True
-        )
-        scheduler.start()
-
-        # Ensure the scheduler shuts down when the app exits
-        atexit.register(lambda: scheduler.shutdown())
-
-        app.logger.info("APScheduler started and reminder job added.")
+    # Only the process designated to run the periodic jobs starts the
+    # scheduler; see app/scheduler.py
+    if app.config['SCHEDULER_ENABLED']:
+        from .scheduler import start_background_scheduler
+        start_background_scheduler(app)
 
     return app
\ No newline at end of file
@@ -0,0 +1,341 @@
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from flask import Blueprint, Response, request, jsonify, abort, current_app
+from flask_login import login_required, current_user
+from werkzeug.exceptions import HTTPException, NotFound, UnprocessableEntity
+from extensions import db
+from .events import event_stream
+from .forms import clean_todo_data
+from .models import Todo, CompletionStat, TodoTombstone, RecurrenceException, todo_tags, parse_tags
+from .queries import (
+    dashboard_todos, keyset_page, todo_changes, todo_deletions, encode_sync_cursor, decode_sync_cursor,
+    completed_occurrences
+)
+from .reminders import as_utc, next_reminder_at
+from .replica import read_only
+
+# Versioned JSON API for scripts and integrations. Every batch endpoint checks
+# ownership of the whole set with one query, writes with set-based statements
+# and commits once, so a batch is applied completely or not at all.
+api_bp = Blueprint('api_bp', __name__, url_prefix='/api/v1')
+
+TODO_FIELDS = ('description', 'due_date', 'status', 'priority', 'tags', 'recurrence')
+
+@api_bp.errorhandler(HTTPException)
+def json_error(error):
+    response = jsonify({'error': error.description, **getattr(error, 'data', {})})
+    response.status_code = error.code
+    return response
+
+@api_bp.before_request
+def require_json():
+    # The blueprint is exempt from CSRF tokens: insisting on a JSON body keeps
+    # other sites from posting to it, as browsers cannot send one cross-origin
+    # without a CORS preflight.
+    if request.method != 'GET' and not request.is_json:
+        abort(415, description='Send the request body as application/json.')
+
+# --- Validation ---
+
+def invalid(errors):
+    """Abort with 422 and per-item field errors, keyed by the item's position in the batch."""
+    error = UnprocessableEntity('Some items are invalid; nothing was changed.')
+    error.data = {'errors': errors}
+    raise error
+
+def json_items(key):
+    """The list under `key` in the JSON body, within the configured batch size."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get(key), list):
+        abort(400, description=f'Expected a JSON object with a "{key}" list.')
+    items = payload[key]
+    limit = current_app.config['API_BATCH_MAX_ITEMS']
+    if not items:
+        abort(400, description=f'"{key}" is empty.')
+    if len(items) > limit:
+        abort(413, description=f'At most {limit} items per request.')
+    return items
+
+def json_ids():
+    ids = json_items('ids')
+    if not all(isinstance(todo_id, int) and not isinstance(todo_id, bool) for todo_id in ids):
+        abort(400, description='"ids" must only contain integers.')
+    return list(dict.fromkeys(ids))
+
+# --- Batch helpers ---
+
+def owned_todos(ids, *columns):
+    """Map id -> row of the given columns for the current user's todos in ids; 404 if any is missing."""
+    rows = db.session.execute(
+        db.select(Todo.id, *columns).filter(Todo.id.in_(ids), Todo.user_id == current_user.id)
+    ).all()
+    found = {row.id: row for row in rows}
+    missing = [todo_id for todo_id in ids if todo_id not in found]
+    if missing:
+        error = NotFound('Some to-dos do not exist or are not yours; nothing was changed.')
+        error.data = {'missing_ids': missing}
+        raise error
+    return found
+
+def adjust_completions(months):
+    """Apply a Counter of {completed month datetime: delta} to the completion counters."""
+    for completed_at, delta in months.items():
+        if delta:
+            CompletionStat.adjust(current_user.id, completed_at, delta)
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+def caught_up_cursor():
+    """A sync cursor for a client whose copy of the todos was read just now."""
+    now = datetime.now(timezone.utc)
+    return encode_sync_cursor((now - timedelta(seconds=current_app.config['SYNC_CURSOR_LAG_SECONDS']), 0), now)
+
+def todos_response(ids, status=200):
+    todos = db.session.execute(
+        db.select(Todo).filter(Todo.id.in_(ids)).options(db.selectinload(Todo.tag_objects))
+    ).scalars()
+    by_id = {todo.id: todo for todo in todos}
+    return jsonify({'todos': [by_id[todo_id].to_dict() for todo_id in ids]}), status
+
+# --- Todo Endpoints ---
+
+@api_bp.route('/todos', methods=['GET'])
+@login_required
+@read_only
+def list_todos():
+    page = keyset_page(
+        dashboard_todos(current_user.id),
+        per_page=current_app.config['TODOS_PER_PAGE'],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return jsonify({
+        'todos': [todo.to_dict() for todo in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    })
+
+@api_bp.route('/todos/changes', methods=['GET'])
+@login_required
+def list_changes():
+    """
+    Todos created or changed, and ids of todos deleted, after the `since`
+    cursor, oldest change first. Without `since` every todo is listed.
+
+    A client stores next_cursor and asks again while has_more is true. Once it
+    has caught up, next_cursor lags SYNC_CURSOR_LAG_SECONDS behind the clock,
+    so a transaction that committed late is still picked up and the latest
+    changes may be sent twice; apply entries as upserts by id.
+    """
+    now = datetime.now(timezone.utc)
+    since = None
+    if request.args.get('since'):
+        decoded = decode_sync_cursor(request.args['since'])
+        if decoded is None:
+            abort(400, description='"since" is not a valid cursor.')
+        (moment, row_id), issued_at = decoded
+        if as_utc(issued_at) < now - timedelta(days=current_app.config['SYNC_TOMBSTONE_DAYS']):
+            abort(410, description='Deletions this old are forgotten; sync again without "since".')
+        since = (as_utc(moment), row_id)
+    limit = current_app.config['SYNC_PAGE_SIZE']
+
+    todos = db.session.execute(
+        todo_changes(current_user.id, since).options(db.selectinload(Todo.tag_objects)).limit(limit + 1)
+    ).scalars()
+    entries = [(as_utc(todo.updated_at), todo.id, {**todo.to_dict(), 'deleted': False}) for todo in todos]
+    if since is not None:
+        # A client without a cursor has nothing to delete
+        deletions = db.session.execute(todo_deletions(current_user.id, since).limit(limit + 1))
+        entries.extend(
+            (as_utc(row.deleted_at), row.todo_id,
+             {'id': row.todo_id, 'deleted': True, 'deleted_at': row.deleted_at.isoformat()})
+            for row in deletions
+        )
+    entries.sort(key=lambda entry: entry[:2])
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    cursor = (now - timedelta(seconds=current_app.config['SYNC_CURSOR_LAG_SECONDS']), 0)
+    if has_more:
+        cursor = entries[-1][:2]
+    elif since is not None:
+        cursor = max(since, cursor)
+    return jsonify({
+        'changes': [entry for _, _, entry in entries],
+        'next_cursor': encode_sync_cursor(cursor, now),
+        'has_more': has_more
+    })
+
+@api_bp.route('/events', methods=['GET'])
+@login_required
+def todo_events():
+    """
+    Server-Sent Events stream with a "todos" event whenever the user's todos
+    change. Clients then fetch /todos/changes; see app/static/js/live_todos.js.
+    """
+    config = current_app.config
+    # The generator outlives the request context and never touches the database
+    stream = event_stream(
+        current_app.extensions['events'], current_user.id,
+        config['EVENTS_HEARTBEAT_SECONDS'], config['EVENTS_STREAM_SECONDS']
+    )
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Keep nginx from holding events back
+    return response
+
+@api_bp.route('/todos', methods=['POST'])
+@login_required
+def create_todos():
+    """Create every todo in {"todos": [...]} with multi-row INSERTs; the response lists them by id."""
+    items = json_items('todos')
+    cleaned = [clean_todo_data(item) for item in items]
+    errors = {index: item_errors for index, (_, item_errors) in enumerate(cleaned) if item_errors}
+    if errors:
+        invalid(errors)
+
+    ids = Todo.insert_many(current_user.id, [values for values, _ in cleaned])
+    current_user.touch_todos()
+    db.session.commit()
+    return todos_response(ids, 201)
+
+@api_bp.route('/todos', methods=['PATCH'])
+@login_required
+def update_todos():
+    """Apply the fields given for each {"id": ..., ...} in {"todos": [...]}, with one UPDATE per field set."""
+    items = json_items('todos')
+    cleaned, errors = [], {}
+    for index, item in enumerate(items):
+        values, item_errors = clean_todo_data(item, partial=True)
+        todo_id = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(todo_id, int) or isinstance(todo_id, bool):
+            item_errors['id'] = 'This field is required.'
+        elif not values and not item_errors:
+            item_errors['item'] = f"Nothing to update; give any of: {', '.join(TODO_FIELDS)}."
+        if item_errors:
+            errors[index] = item_errors
+        cleaned.append((todo_id, values))
+    if errors:
+        invalid(errors)
+    ids = [todo_id for todo_id, _ in cleaned]
+    if len(set(ids)) != len(ids):
+        abort(400, description='Each to-do may appear only once per batch.')
+
+    current = owned_todos(ids, Todo.status, Todo.due_date, Todo.completed_at, Todo.created_at, Todo.recurrence)
+    # A repeating todo is anchored at its due date, so neither may end up without the other
+    for index, (todo_id, values) in enumerate(cleaned):
+        row = current[todo_id]
+        due_date = values['due_date'] if 'due_date' in values else row.due_date
+        if values.get('recurrence', row.recurrence) and not due_date:
+            errors[index] = {'recurrence': 'A repeating to-do needs a due date.'}
+    if errors:
+        invalid(errors)
+
+    # Occurrences completed so far still count when a repeating todo keeps its rule
+    kept_series = []
+    for todo_id, values in cleaned:
+        recurrence = current[todo_id].recurrence
+        if recurrence and values.get('recurrence', recurrence) == recurrence:
+            kept_series.append(todo_id)
+    completed = {}
+    if kept_series:
+        for row in db.session.execute(completed_occurrences(kept_series, date.min, date.max)):
+            completed.setdefault(row.todo_id, set()).add(row.occurrence)
+
+    now = datetime.now(timezone.utc)
+    completions = Counter()
+    updates, tag_names, new_series = [], {}, []
+    for todo_id, values in cleaned:
+        row = current[todo_id]
+        if values.get('recurrence', row.recurrence) != row.recurrence:
+            # Completed occurrences belong to the old rule
+            new_series.append(todo_id)
+        if 'tags' in values:
+            names = parse_tags(values.pop('tags'))
+            tag_names[todo_id] = names
+            values['tags'] = ', '.join(names) or None
+        if values.get('status', row.status) != row.status:
+            if row.status == 'complete':
+                completions[month_start(row.completed_at or row.created_at)] -= 1
+                values['completed_at'] = None
+            else:
+                completions[month_start(now)] += 1
+                values['completed_at'] = now
+        if {'due_date', 'status', 'recurrence'} & values.keys():
+            values['next_reminder_at'] = next_reminder_at(
+                values.get('due_date', row.due_date), values.get('status', row.status),
+                values.get('recurrence', row.recurrence), current_user.timezone, completed.get(todo_id, ())
+            )
+        updates.append({'id': todo_id, **values})
+
+    # ORM bulk UPDATE by primary key runs one executemany per run of rows with
+    # the same keys, so rows are grouped by their key set first
+    updates.sort(key=lambda values: sorted(values))
+    db.session.execute(db.update(Todo), updates)
+    if new_series:
+        RecurrenceException.forget(new_series)
+    if tag_names:
+        Todo.link_tags(current_user.id, tag_names)
+    adjust_completions(completions)
+    current_user.touch_todos()
+    db.session.commit()
+    return todos_response(ids)
+
+@api_bp.route('/todos/complete', methods=['POST'])
+@login_required
+def complete_todos():
+    """
+    Mark every todo in {"ids": [...]} complete with a single UPDATE. A pending
+    repeating todo only has its next occurrence completed, as on the dashboard.
+    """
+    ids = json_ids()
+    current = owned_todos(ids, Todo.status, Todo.recurrence)
+    series_ids = [todo_id for todo_id, row in current.items() if row.recurrence and row.status == 'pending']
+    now = datetime.now(timezone.utc)
+    result = db.session.execute(
+        db.update(Todo)
+        .where(Todo.id.in_(ids), Todo.status == 'pending', Todo.recurrence.is_(None))
+        .values(status='complete', completed_at=now, next_reminder_at=None),
+        execution_options={'synchronize_session': False}
+    )
+    adjust_completions(Counter({now: result.rowcount}))
+    completed = result.rowcount
+
+    occurrences = []
+    for todo in db.session.execute(db.select(Todo).filter(Todo.id.in_(series_ids))).scalars():
+        occurrence = todo.next_occurrence()
+        if occurrence is None:
+            todo.set_status('complete')  # The series ran out before this was completed
+        else:
+            todo.complete_occurrence(occurrence)
+            occurrences.append({'id': todo.id, 'occurrence': occurrence.isoformat()})
+        if todo.status == 'complete':
+            completed += 1
+
+    current_user.touch_todos()
+    db.session.commit()
+    return jsonify({'completed': completed, 'occurrences_completed': occurrences})
+
+@api_bp.route('/todos', methods=['DELETE'])
+@login_required
+def delete_todos():
+    """Delete every todo in {"ids": [...]} with a single DELETE."""
+    ids = json_ids()
+    current = owned_todos(ids, Todo.status, Todo.completed_at, Todo.created_at)
+    completions = Counter(
+        month_start(row.completed_at or row.created_at)
+        for row in current.values() if row.status == 'complete'
+    )
+    adjust_completions(Counter({month: -count for month, count in completions.items()}))
+    # SQLite does not enforce ON DELETE CASCADE unless asked to, so unlink tags explicitly
+    db.session.execute(db.delete(todo_tags).where(todo_tags.c.todo_id.in_(ids)))
+    RecurrenceException.forget(ids)
+    TodoTombstone.record(current_user.id, ids)
+    result = db.session.execute(
+        db.delete(Todo).where(Todo.id.in_(ids)),
+        execution_options={'synchronize_session': False}
+    )
+    current_user.touch_todos()
+    db.session.commit()
+    return jsonify({'deleted': result.rowcount})
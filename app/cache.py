@@ -0,0 +1,254 @@
+import importlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context, Response
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from extensions import db
+
+class LocalCache:
+    """
+    Thread-safe, size-bounded LRU cache with a per-entry TTL, held in process
+    memory. Counts hits and misses.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=60, **options):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None when absent or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl_seconds=None):
+        expires_at = time.monotonic() + (ttl_seconds or self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class RedisCache:
+    """
+    Cache shared by every process through Redis, with the LocalCache interface.
+
+    Needs the optional `redis` package. Values are pickled, so only point it
+    at a Redis instance the application trusts.
+    """
+
+    def __init__(self, url, prefix='todo', ttl_seconds=60, **options):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def get(self, key):
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl_seconds=None):
+        self.client.set(self._key(key), pickle.dumps(value), ex=ttl_seconds or self.ttl_seconds)
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}:*'):
+            self.client.delete(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+CACHE_BACKENDS = {
+    'local': LocalCache,
+    'redis': RedisCache,
+}
+
+def make_cache(app, prefix, max_entries, ttl_seconds):
+    """
+    Build a cache from CACHE_BACKEND: 'local', 'redis', or the dotted path
+    ('package.module:Class') of any class with the LocalCache interface.
+    """
+    backend = app.config['CACHE_BACKEND']
+    cache_class = CACHE_BACKENDS.get(backend)
+    if cache_class is None:
+        module_name, _, class_name = backend.partition(':')
+        cache_class = getattr(importlib.import_module(module_name), class_name)
+    return cache_class(
+        url=app.config['CACHE_REDIS_URL'],
+        prefix=prefix,
+        max_entries=max_entries,
+        ttl_seconds=ttl_seconds
+    )
+
+# --- User identity cache ---
+#
+# Flask-Login calls the user loader on every authenticated request. The cache
+# keeps each user's column values so the loader can rebuild the User without a
+# SELECT; any change to a User row evicts it once the transaction commits.
+#
+# Eviction only reaches the cache of the process that committed, so with the
+# local backend other workers keep the old row until the TTL. That is fine
+# for the identity, but not for the columns every todo change bumps: those
+# are left out and read fresh from the database (one primary-key SELECT) the
+# first time a request uses them.
+UNCACHED_USER_COLUMNS = frozenset({'todos_version', 'todos_modified_at'})
+
+def user_columns(user):
+    return {
+        attr.key: getattr(user, attr.key)
+        for attr in inspect(user).mapper.column_attrs
+        if attr.key not in UNCACHED_USER_COLUMNS
+    }
+
+def load_cached_user(user_id):
+    """The User with this id, from the cache when possible, attached to the current session."""
+    from .models import User
+    cache = current_app.extensions['user_cache']
+    data = cache.get(user_id)
+    if data is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.set(user_id, user_columns(user))
+        return user
+
+    user = User(**data)
+    # The uncached columns are left expired, so they load on first access
+    make_transient_to_detached(user)
+    # load=False attaches the rebuilt instance without querying the database
+    return db.session.merge(user, load=False)
+
+def invalidate_user(user_id):
+    current_app.extensions['user_cache'].delete(user_id)
+
+def _remember_changed_user(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+def _evict_changed_users(session):
+    changed = session.info.pop('changed_user_ids', None)
+    if changed and has_app_context() and 'user_cache' in current_app.extensions:
+        for user_id in changed:
+            invalidate_user(user_id)
+
+def init_user_cache(app):
+    from .models import User
+    app.extensions['user_cache'] = make_cache(
+        app,
+        prefix='user',
+        max_entries=app.config['USER_CACHE_MAX_ENTRIES'],
+        ttl_seconds=app.config['USER_CACHE_TTL_SECONDS']
+    )
+    if not event.contains(User, 'after_update', _remember_changed_user):
+        event.listen(User, 'after_update', _remember_changed_user)
+        event.listen(User, 'after_delete', _remember_changed_user)
+        # Evict after commit so no request re-caches the old row in between;
+        # on rollback the cached copy is still accurate but is dropped anyway
+        event.listen(Session, 'after_commit', _evict_changed_users)
+        event.listen(Session, 'after_soft_rollback', lambda session, previous: _evict_changed_users(session))
+
+# --- Versioned page cache ---
+#
+# Rendered fragments and JSON payloads of the todo views, keyed by the user and
+# their todos_version. Every change to a user's todos bumps the version, so an
+# entry never has to be invalidated: the next request simply misses and the
+# old entries age out of the LRU.
+
+# Stands in for the per-session CSRF token in cached HTML
+CSRF_PLACEHOLDER = '__csrf_token_placeholder__'
+
+def page_cache_key(name, parts):
+    # The version is read with the page's own queries rather than taken from
+    # current_user, which another process's change may have left behind
+    from .models import User
+    version = db.session.execute(
+        db.select(User.todos_version).filter(User.id == current_user.id)
+    ).scalar_one()
+    return ':'.join(str(part) for part in (current_user.id, version, name, *parts))
+
+def cached_fragment(name, parts, render):
+    """
+    HTML built by render() for the current user, cached until their todos change.
+
+    parts distinguishes variants of the same view (page cursors, filters).
+    CSRF tokens are stored as a placeholder and filled in per request.
+    """
+    cache = current_app.extensions['page_cache']
+    key = page_cache_key(name, parts)
+    token = generate_csrf()
+    html = cache.get(key)
+    if html is None:
+        html = render().replace(token, CSRF_PLACEHOLDER)
+        cache.set(key, html)
+    return Markup(html.replace(CSRF_PLACEHOLDER, token))
+
+def cached_json(name, parts, build):
+    """A JSON response of build()'s data for the current user, cached until their todos change."""
+    cache = current_app.extensions['page_cache']
+    key = page_cache_key(name, parts)
+    body = cache.get(key)
+    if body is None:
+        body = current_app.json.dumps(build())
+        cache.set(key, body)
+    return Response(body, mimetype='application/json')
+
+def init_page_cache(app):
+    app.extensions['page_cache'] = make_cache(
+        app,
+        prefix='page',
+        max_entries=app.config['PAGE_CACHE_MAX_ENTRIES'],
+        ttl_seconds=app.config['PAGE_CACHE_TTL_SECONDS']
+    )
@@ -0,0 +1,206 @@
+import re
+import click
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from flask.cli import ScriptInfo, with_appcontext
+from sqlalchemy import create_engine
+from extensions import db, init_migrate
+from .queries import (
+    dashboard_todos, calendar_todos, completed_todos, due_reminders, todos_by_tag, tag_counts,
+    todo_changes, todo_deletions, archived_todos, archivable_todos, recurring_todos, completed_occurrences
+)
+
+# "SCAN todos" (or "SCAN TABLE todos" on SQLite < 3.36) means every row of the
+# table is visited, with or without a covering index. Tombstones and the
+# archive grow as fast.
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (TABLE )?(todos|todo_tombstones|todos_archive)\b')
+
+def hot_queries():
+    """The statements every hot route and job issues, keyed by their caller."""
+    now_utc = datetime.now(timezone.utc)
+    return {
+        'user_dashboard': dashboard_todos(1),
+        'todos_calendar_api': calendar_todos(1, now_utc, now_utc + timedelta(days=42)),
+        'completed_todos_history': completed_todos(1),
+        'send_due_date_reminders': due_reminders(now_utc),
+        'recurring_todos': recurring_todos(1, now_utc + timedelta(days=42)),
+        'completed_occurrences': completed_occurrences([1, 2], now_utc.date(), now_utc.date() + timedelta(days=42)),
+        'todos_by_tag': todos_by_tag(1, 'work'),
+        'tag_counts': tag_counts(1),
+        'todo_changes': todo_changes(1, (now_utc, 0)),
+        'todo_deletions': todo_deletions(1, (now_utc, 0)),
+        'archived_todos': archived_todos(1),
+        'archive_completed_todos': archivable_todos(now_utc - timedelta(days=90), 500),
+    }
+
+def explain_query_plan(connection, stmt):
+    """Return the detail column of SQLite's EXPLAIN QUERY PLAN for a statement."""
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).all()
+    return [row[-1] for row in rows]
+
+@click.command('check-indexes')
+@click.option('--use-app-db', is_flag=True,
+              help="Explain against the configured database instead of a scratch one built from the models.")
+@with_appcontext
+def check_indexes(use_app_db):
+    """Fail if any hot query needs a full scan of the todos or tombstones table."""
+    if use_app_db:
+        engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            raise click.UsageError('check-indexes only understands SQLite query plans.')
+    else:
+        engine = create_engine('sqlite://')
+        db.metadata.create_all(engine)
+
+    failures = []
+    with engine.connect() as connection:
+        for name, stmt in hot_queries().items():
+            plan = explain_query_plan(connection, stmt)
+            click.echo(f'{name}:')
+            for detail in plan:
+                click.echo(f'    {detail}')
+            if any(FULL_SCAN_PATTERN.match(detail) for detail in plan):
+                failures.append(name)
+
+    if failures:
+        raise click.ClickException(f"Full table scan in: {', '.join(failures)}")
+    click.echo('All hot queries use an index.')
+
+@click.command('send-reminders')
+@with_appcontext
+def send_reminders():
+    """Queue the due-date reminder digests now and print the job's statistics."""
+    from .tasks import send_due_date_reminders
+    stats = send_due_date_reminders(current_app._get_current_object())
+    for key, value in stats.items():
+        click.echo(f'{key}: {value}')
+
+@click.command('reschedule-reminders')
+@click.argument('username', required=False)
+@with_appcontext
+def reschedule_reminders_command(username):
+    """Recompute when each pending to-do is reminded, for USERNAME or every user."""
+    from .models import User, Todo
+    users = [find_user(username)] if username else db.session.execute(db.select(User)).scalars().all()
+    for user in users:
+        Todo.reschedule_reminders(user.id, user.timezone)
+        db.session.commit()
+    click.echo(f'Rescheduled the reminders of {len(users)} users.')
+
+@click.command('drain-outbox')
+@with_appcontext
+def drain_outbox_command():
+    """Deliver the due emails in the outbox now and print the run's statistics."""
+    from .mailqueue import drain_outbox
+    stats = drain_outbox(current_app._get_current_object())
+    for key, value in stats.items():
+        click.echo(f'{key}: {value}')
+
+@click.command('run-scheduler')
+@with_appcontext
+def run_scheduler_command():
+    """Run the periodic jobs in the foreground, as the designated scheduler process."""
+    from .scheduler import run_blocking_scheduler
+    run_blocking_scheduler(current_app._get_current_object())
+
+class MigrationsGroup(click.Command):
+    """
+    Stands in for Flask-Migrate's `flask db` group, importing it only when the
+    group is invoked so that no other command (nor the web app) loads Alembic.
+    """
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        init_migrate(parent.ensure_object(ScriptInfo).load_app())
+        from flask_migrate.cli import db as group
+        return group.make_context(info_name, args, parent=parent, **extra)
+
+def find_user(username):
+    """The user signing in as username (or email), ignoring case as sign-in does."""
+    from .models import User
+    user = User.find_by_login(username)
+    if user is None:
+        raise click.BadParameter(f'No user named {username!r}.', param_hint='USERNAME')
+    return user
+
+@click.command('export-todos')
+@click.argument('username')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@with_appcontext
+def export_todos_command(username, output, fmt):
+    """Write all to-dos of USERNAME to OUTPUT (standard output by default)."""
+    from .transfer import EXPORT_WRITERS, export_records
+    user = find_user(username)
+    for chunk in EXPORT_WRITERS[fmt](export_records(user.id, current_app.config['EXPORT_BATCH_SIZE'])):
+        output.write(chunk)
+
+@click.command('import-todos')
+@click.argument('username')
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help="Defaults to the one matching SOURCE's extension.")
+@with_appcontext
+def import_todos_command(username, source, fmt):
+    """Import the to-dos in a CSV or NDJSON file SOURCE for USERNAME."""
+    from .transfer import import_format, import_todos
+    user = find_user(username)
+    fmt = fmt or import_format(source.name)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format.')
+    stats = import_todos(user, source, fmt, current_app.config['IMPORT_CHUNK_SIZE'], max_errors=1000)
+    for error in stats['errors']:
+        details = '; '.join(f'{field}: {message}' for field, message in error['errors'].items())
+        click.echo(f"line {error['line']}: {details}", err=True)
+    click.echo(f"imported: {stats['imported']}")
+    click.echo(f"invalid: {stats['invalid']}")
+
+@click.command('seed-data')
+@click.option('--users', 'user_count', type=click.IntRange(1), default=10, show_default=True)
+@click.option('--todos-per-user', type=click.IntRange(0), default=100, show_default=True)
+@click.option('--prefix', default='user', show_default=True, help='Seeded users are named PREFIX1, PREFIX2, ...')
+@click.option('--password', default='password', show_default=True, help='Password shared by every seeded user.')
+@click.option('--seed', type=int, help='Random seed, for a reproducible data set.')
+@with_appcontext
+def seed_data_command(user_count, todos_per_user, prefix, password, seed):
+    """Create synthetic users and to-dos for load tests and benchmarks."""
+    from .passwords import hash_password
+    from .seed import seed_data
+    user_ids = seed_data(user_count, todos_per_user, hash_password(password), prefix=prefix, seed=seed)
+    click.echo(f'Created {len(user_ids)} users with {todos_per_user} to-dos each.')
+
+@click.command('sync-replica')
+@click.option('--every', type=click.IntRange(1), metavar='SECONDS',
+              help='Copy again every SECONDS until interrupted.')
+@with_appcontext
+def sync_replica_command(every):
+    """Copy the SQLite database to the SQLite read replica, for trying replica routing locally."""
+    import time
+    from .replica import copy_sqlite_database, replica_configured
+    if not replica_configured(current_app):
+        raise click.UsageError('Set REPLICA_DATABASE_URL first.')
+    primary, replica = db.engines[None].url, db.engines['replica'].url
+    if primary.get_backend_name() != 'sqlite' or replica.get_backend_name() != 'sqlite':
+        raise click.UsageError('sync-replica only copies between SQLite files; use your database\'s replication.')
+    while True:
+        copy_sqlite_database(primary.database, replica.database)
+        click.echo(f'Copied {primary.database} to {replica.database}.')
+        if every is None:
+            return
+        try:
+            time.sleep(every)
+        except KeyboardInterrupt:
+            return
+
+def init_app(app):
+    app.cli.add_command(check_indexes)
+    app.cli.add_command(send_reminders)
+    app.cli.add_command(reschedule_reminders_command)
+    app.cli.add_command(drain_outbox_command)
+    app.cli.add_command(export_todos_command)
+    app.cli.add_command(import_todos_command)
+    app.cli.add_command(seed_data_command)
+    app.cli.add_command(sync_replica_command)
+    app.cli.add_command(run_scheduler_command)
+    app.cli.add_command(MigrationsGroup('db', help='Perform database migrations.'))
@@ -0,0 +1,20 @@
+from sqlalchemy import event
+from extensions import db
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run `PRAGMA name=value` for each of pragmas on every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+def init_app(app):
+    # Flask-SQLAlchemy builds the engines in init_app but only connects on first use
+    with app.app_context():
+        for engine in db.engines.values():
+            install_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
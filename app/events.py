@@ -0,0 +1,186 @@
+import importlib
+import json
+import queue
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Live updates. Every commit that changes a user's todos publishes a "todos"
+# event for that user; the pages listen on a Server-Sent Events stream and
+# answer each event by fetching just the changes from /api/v1/todos/changes.
+# Events carry no todo data, so one that is lost or arrives twice is harmless.
+
+
+class Subscription:
+    """A queue of events for one open stream. Use as a context manager."""
+
+    def __init__(self, broker, user_id, max_events):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=max_events)
+
+    def get(self, timeout):
+        """The next event, waiting up to timeout seconds. Raises queue.Empty."""
+        return self.queue.get(timeout=timeout)
+
+    def drain(self):
+        """Drop the events already waiting; the caller has just handled an equivalent one."""
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    Thread-safe publish/subscribe within this process. Only reaches streams
+    served by the same process, so it suits a single worker.
+    """
+
+    def __init__(self, max_events=100, **options):
+        self.max_events = max_events
+        self._subscriptions = {}  # user_id -> set of Subscription
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, self.max_events)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_id, data):
+        self.deliver(user_id, data)
+
+    def deliver(self, user_id, data):
+        """Hand an event to this process's streams of the user."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(data)
+            except queue.Full:
+                pass  # Unread events are waiting already; the stream catches up on those
+
+    def stats(self):
+        with self._lock:
+            return {'streams': sum(len(subscriptions) for subscriptions in self._subscriptions.values())}
+
+
+class RedisBroker(LocalBroker):
+    """
+    Fans events out to every process through a Redis channel. Each process
+    runs one listener thread that delivers what it receives to its own streams.
+
+    Needs the optional `redis` package.
+    """
+
+    def __init__(self, url, prefix='todo', max_events=100, **options):
+        import redis
+        super().__init__(max_events=max_events)
+        self.client = redis.Redis.from_url(url)
+        self.channel = f'{prefix}:events'
+        self._listener = None
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='todo-events', daemon=True)
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, data):
+        self.client.publish(self.channel, json.dumps({'user_id': user_id, 'data': data}))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    self.deliver(payload['user_id'], payload['data'])
+            except Exception:
+                time.sleep(1)  # Redis went away; events published meanwhile are lost, which pages tolerate
+
+
+EVENT_BACKENDS = {
+    'local': LocalBroker,
+    'redis': RedisBroker,
+}
+
+def make_broker(app):
+    """
+    Build the broker from EVENTS_BACKEND: 'local', 'redis', or the dotted path
+    ('package.module:Class') of any class with the LocalBroker interface.
+    """
+    backend = app.config['EVENTS_BACKEND']
+    broker_class = EVENT_BACKENDS.get(backend)
+    if broker_class is None:
+        module_name, _, class_name = backend.partition(':')
+        broker_class = getattr(importlib.import_module(module_name), class_name)
+    return broker_class(
+        url=app.config['EVENTS_REDIS_URL'],
+        prefix='todo',
+        max_events=app.config['EVENTS_QUEUE_SIZE']
+    )
+
+# --- Publishing ---
+#
+# User.touch_todos() notes the user in the session; the event goes out only
+# once the transaction commits, so a listener never fetches before the change
+# is visible.
+
+def _publish_touched(session):
+    touched = session.info.pop('todos_touched', None)
+    if touched and has_app_context() and 'events' in current_app.extensions:
+        broker = current_app.extensions['events']
+        for user_id in touched:
+            broker.publish(user_id, {'type': 'todos'})
+
+def _forget_touched(session, previous_transaction):
+    session.info.pop('todos_touched', None)
+
+# --- Streaming ---
+
+def event_stream(broker, user_id, heartbeat_seconds, max_seconds):
+    """
+    Yield a user's events as Server-Sent Events text until max_seconds have
+    passed, with a comment line every heartbeat_seconds so proxies keep the
+    connection open and a closed client is noticed.
+    """
+    deadline = time.monotonic() + max_seconds
+    # Subscribing here rather than in the view means a response that is never
+    # iterated leaves no subscription behind
+    with broker.subscribe(user_id) as subscription:
+        # Browsers reconnect on their own when the stream ends; ask them to wait a little
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            try:
+                data = subscription.get(timeout=min(heartbeat_seconds, max(deadline - time.monotonic(), 0.01)))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            subscription.drain()
+            yield f"event: {data['type']}\ndata: {json.dumps(data)}\n\n"
+
+def init_app(app):
+    app.extensions['events'] = make_broker(app)
+    if not event.contains(Session, 'after_commit', _publish_touched):
+        event.listen(Session, 'after_commit', _publish_touched)
+        event.listen(Session, 'after_soft_rollback', _forget_touched)
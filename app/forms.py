@@ -1,8 +1,10 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, TextAreaField, DateField, SelectField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
+from wtforms.validators import DataRequired, Email, EqualTo, Length, Regexp, ValidationError
 from .models import User, Todo 
-from extensions import db
+from .recurrence import normalize_rule
+from .reminders import timezone_names
 from flask_login import current_user
 from datetime import date
 
@@ -10,7 +12,12 @@ class RegistrationForm(FlaskForm):
     """User signup form."""
     username = StringField(
         'Username',
-        validators=[DataRequired(), Length(min=2, max=80)]
+        validators=[
+            DataRequired(),
+            Length(min=2, max=80),
+            # Sign-in tells emails from usernames by the '@'
+            Regexp(r'^[^@]+$', message='Usernames cannot contain "@".')
+        ]
     )
     email = StringField(
         'Email',
@@ -26,15 +33,17 @@ class RegistrationForm(FlaskForm):
     )
     submit = SubmitField('Sign Up')
 
-    def validate_username(self, username):
-        user = db.session.execute(db.select(User).filter_by(username=username.data)).scalar_one_or_none()
-        if user:
-            raise ValidationError('That username is taken. Please choose a different one.')
+    # Uniqueness is enforced by the unique indexes on users; signup turns their
+    # IntegrityError into errors on these fields (see add_duplicate_errors)
 
-    def validate_email(self, email):
-        user = db.session.execute(db.select(User).filter_by(email=email.data)).scalar_one_or_none()
-        if user:
-            raise ValidationError('That email is taken. Please choose a different one.')
+    def add_duplicate_errors(self, error):
+        """Report a unique-constraint violation from inserting the new user on the right field."""
+        # The first line names the violated constraint or column; later lines may quote values
+        message = str(error.orig).splitlines()[0].lower()
+        if 'email' in message:
+            self.email.errors.append('That email is taken. Please choose a different one.')
+        else:
+            self.username.errors.append('That username is taken. Please choose a different one.')
 
 
 class LoginForm(FlaskForm):
@@ -56,8 +65,9 @@ class RequestResetForm(FlaskForm):
     submit = SubmitField('Request Password Reset')
 
     def validate_email(self, email):
-        user = db.session.execute(db.select(User).filter_by(email=email.data)).scalar_one_or_none()
-        if user is None:
+        # Kept for the view, which would otherwise look the user up again
+        self.user = User.find_by_login(email.data)
+        if self.user is None:
             raise ValidationError('There is no account with that email address.')
 
 class ResetPasswordForm(FlaskForm):
@@ -99,4 +109,110 @@ class TodoForm(FlaskForm):
         default='medium',
         validators=[DataRequired()]
     )
-    submit = SubmitField('Save To-do')
\ No newline at end of file
+    recurrence = StringField(
+        'Repeats (iCalendar RRULE, optional)',
+        validators=[Length(max=100)],
+        render_kw={"placeholder": "FREQ=WEEKLY;BYDAY=MO"}
+    )
+    submit = SubmitField('Save To-do')
+
+    def validate_recurrence(self, recurrence):
+        try:
+            recurrence.data = normalize_rule(recurrence.data)
+        except ValueError as e:
+            raise ValidationError(str(e))
+        # The due date is the first occurrence
+        if recurrence.data and not self.due_date.data:
+            raise ValidationError('A repeating to-do needs a due date.')
+
+class SettingsForm(FlaskForm):
+    """Account settings."""
+    timezone = SelectField(
+        'Timezone',
+        validators=[DataRequired()],
+        description='Due dates start at midnight here, and reminders go out a day before.'
+    )
+    submit = SubmitField('Save Settings')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timezone.choices = timezone_names()
+
+class ImportForm(FlaskForm):
+    """Upload of a CSV or NDJSON file of to-dos."""
+    file = FileField(
+        'File',
+        validators=[FileRequired(), FileAllowed(['csv', 'ndjson', 'jsonl'], 'Upload a .csv, .ndjson or .jsonl file.')]
+    )
+    submit = SubmitField('Import')
+
+# The choices of TodoForm, for data that does not come from the form
+STATUSES = ('pending', 'complete')
+PRIORITIES = ('low', 'medium', 'high')
+
+def clean_todo_data(item, partial=False):
+    """
+    Validate one todo given as a dict (JSON body, import record) with the rules of TodoForm.
+
+    Returns (values, errors). With partial=True absent fields are left out
+    instead of being required or defaulted.
+    """
+    values, errors = {}, {}
+    if not isinstance(item, dict):
+        return values, {'item': 'Expected an object.'}
+
+    if 'description' in item or not partial:
+        description = item.get('description')
+        if not isinstance(description, str) or not description.strip():
+            errors['description'] = 'This field is required.'
+        elif len(description) > 200:
+            errors['description'] = 'Field cannot be longer than 200 characters.'
+        else:
+            values['description'] = description
+
+    if 'due_date' in item or not partial:
+        due_date = item.get('due_date')
+        try:
+            values['due_date'] = date.fromisoformat(due_date) if due_date else None
+        except (TypeError, ValueError):
+            errors['due_date'] = 'Not a valid date value (YYYY-MM-DD).'
+
+    if 'status' in item or not partial:
+        status = item.get('status', 'pending')
+        if status not in STATUSES:
+            errors['status'] = f"Not a valid choice: {', '.join(STATUSES)}."
+        else:
+            values['status'] = status
+
+    if 'priority' in item or not partial:
+        priority = item.get('priority', 'medium')
+        if priority not in PRIORITIES:
+            errors['priority'] = f"Not a valid choice: {', '.join(PRIORITIES)}."
+        else:
+            values['priority'] = priority
+
+    if 'tags' in item or not partial:
+        tags = item.get('tags') or ''
+        if isinstance(tags, list) and all(isinstance(tag, str) for tag in tags):
+            tags = ', '.join(tags)
+        if not isinstance(tags, str):
+            errors['tags'] = 'Expected a comma-separated string or a list of strings.'
+        elif len(tags) > 255:
+            errors['tags'] = 'Field cannot be longer than 255 characters.'
+        else:
+            values['tags'] = tags
+
+    if 'recurrence' in item or not partial:
+        recurrence = item.get('recurrence')
+        try:
+            if recurrence is not None and not isinstance(recurrence, str):
+                raise ValueError('Expected a string such as "FREQ=WEEKLY;BYDAY=MO".')
+            values['recurrence'] = normalize_rule(recurrence)
+        except ValueError as e:
+            errors['recurrence'] = str(e)
+        else:
+            # A partial update is checked against the stored due date by the caller
+            if values['recurrence'] and not partial and not values.get('due_date') and 'due_date' not in errors:
+                errors['recurrence'] = 'A repeating to-do needs a due date.'
+
+    return values, errors
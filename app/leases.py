@@ -0,0 +1,58 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from .models import JobLease
+
+# Identifies this process as a lease holder; unique even across hosts and restarts
+OWNER_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+def acquire_lease(name, ttl_seconds):
+    """
+    Take or extend the lease called `name` for ttl_seconds.
+
+    Succeeds when nobody holds the lease, when the previous holder let it
+    expire, or when this process already holds it. Returns True if this
+    process is the holder afterwards.
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=ttl_seconds)
+
+    result = db.session.execute(
+        db.update(JobLease)
+        .where(
+            JobLease.name == name,
+            (JobLease.owner == OWNER_ID) | (JobLease.expires_at < now)
+        )
+        .values(owner=OWNER_ID, expires_at=expires_at)
+    )
+    if result.rowcount == 1:
+        db.session.commit()
+        return True
+
+    # No row we could take over: either it does not exist yet or someone else holds it
+    try:
+        db.session.add(JobLease(name=name, owner=OWNER_ID, expires_at=expires_at))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def run_exclusive(app, name, ttl_seconds, func):
+    """
+    Run func(app) only in the process holding the lease for this job.
+
+    Any process running the scheduler fires each job, and more than one may
+    (SCHEDULER_ENABLED set on several workers, or a deploy overlapping the old
+    one); the lease makes all but one of them skip. The lease is kept
+    (not released) after the run so that peers firing a moment later skip
+    too, and is simply renewed by the holder on its next run.
+    """
+    with app.app_context():
+        if not acquire_lease(name, ttl_seconds):
+            app.logger.info(f"Skipping job {name}: lease is held by another process.")
+            return None
+    return func(app)
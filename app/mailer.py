@@ -0,0 +1,107 @@
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask_mail import Connection
+from extensions import mail_state
+
+class TimeoutConnection(Connection):
+    """
+    A Flask-Mail connection whose socket gives up after timeout seconds.
+    Flask-Mail opens its sockets without one, so a stalled server would
+    hold a send (and the outbox job) forever.
+    """
+
+    def __init__(self, mail, timeout):
+        super().__init__(mail)
+        self.timeout = timeout
+
+    def configure_host(self):
+        if self.mail.use_ssl:
+            host = smtplib.SMTP_SSL(self.mail.server, self.mail.port, timeout=self.timeout)
+        else:
+            host = smtplib.SMTP(self.mail.server, self.mail.port, timeout=self.timeout)
+        host.set_debuglevel(int(self.mail.debug))
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
+class SMTPConnectionPool:
+    """
+    Sends messages from a fixed number of worker threads, each holding one
+    persistent Flask-Mail connection whose socket operations time out after
+    MAIL_QUEUE_SMTP_TIMEOUT_SECONDS.
+
+    Reusing the connection skips the TCP/TLS handshake and SMTP login that
+    `mail.send` pays for every single message. A connection that drops is
+    reopened on the next send from the same thread.
+    """
+
+    def __init__(self, app, size):
+        self.app = app
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='smtp')
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def submit(self, message):
+        """Queue a message for delivery and return its Future."""
+        return self._executor.submit(self._send, message)
+
+    def close(self):
+        """Wait for queued messages, then QUIT every open connection."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            self._quit(connection)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            timeout = self.app.config['MAIL_QUEUE_SMTP_TIMEOUT_SECONDS']
+            connection = TimeoutConnection(mail_state(self.app), timeout).__enter__()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _discard_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            with self._lock:
+                if connection in self._connections:
+                    self._connections.remove(connection)
+            self._quit(connection)
+
+    def _send(self, message):
+        # Connection.send emits Flask-Mail's signal through current_app
+        with self.app.app_context():
+            try:
+                self._connection().send(message)
+            except smtplib.SMTPServerDisconnected:
+                # The server closed an idle connection: reconnect once and retry
+                self._discard_connection()
+                self._connection().send(message)
+            except smtplib.SMTPException:
+                # Rejected message (bad recipient, ...): the connection is still usable
+                raise
+            except OSError:
+                self._discard_connection()
+                raise
+
+    @staticmethod
+    def _quit(connection):
+        try:
+            connection.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            pass
@@ -0,0 +1,149 @@
+import time
+from concurrent.futures import wait
+from datetime import datetime, timedelta, timezone
+from extensions import db
+from .models import OutboundEmail
+
+def enqueue_email(subject, recipients, body, sender=None):
+    """
+    Add an email to the outbox.
+
+    Only stages an INSERT on the current session; the caller commits it
+    together with whatever else the request changed. Delivery happens later
+    in drain_outbox, so no request ever waits on the SMTP server.
+    """
+    email = OutboundEmail(
+        subject=subject,
+        sender=sender,
+        recipients=','.join(recipients),
+        body=body
+    )
+    db.session.add(email)
+    return email
+
+def retry_delay(app, attempts):
+    """Exponential backoff after the given number of failed attempts, capped."""
+    base = app.config['MAIL_QUEUE_RETRY_BASE_SECONDS']
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), app.config['MAIL_QUEUE_RETRY_MAX_SECONDS']))
+
+def due_outbox_batch(now, batch_size):
+    """Oldest pending emails whose next attempt is due."""
+    return (
+        db.select(OutboundEmail)
+        .filter(OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= now)
+        .order_by(OutboundEmail.next_attempt_at, OutboundEmail.id)
+        .limit(batch_size)
+    )
+
+def claim_outbox_batch(now, batch_size, claim_until):
+    """
+    Claim the due batch by moving its next_attempt_at to claim_until, and
+    commit before anything is sent. Another process draining the outbox
+    skips claimed rows, and the conditional UPDATE means only one of two
+    racing processes gets each row; a claim left behind by a crash expires.
+    """
+    ids = db.session.execute(due_outbox_batch(now, batch_size).with_only_columns(OutboundEmail.id)).scalars().all()
+    if not ids:
+        return []
+    claimed = db.session.execute(
+        db.update(OutboundEmail)
+        .where(
+            OutboundEmail.id.in_(ids),
+            OutboundEmail.status == 'pending',
+            OutboundEmail.next_attempt_at <= now
+        )
+        .values(next_attempt_at=claim_until)
+        .returning(OutboundEmail.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    if not claimed:
+        return []
+    return db.session.execute(
+        db.select(OutboundEmail).filter(OutboundEmail.id.in_(claimed)).order_by(OutboundEmail.id)
+    ).scalars().all()
+
+def drain_outbox(app):
+    """
+    Deliver due emails from the outbox in batches.
+    This function runs in a background thread via APScheduler.
+
+    Each batch is claimed first, then sent concurrently over
+    MAIL_QUEUE_CONCURRENCY persistent SMTP connections and its outcome
+    committed in one transaction. Failed emails are retried with exponential
+    backoff until MAIL_QUEUE_MAX_ATTEMPTS is reached. A run stops taking new
+    batches after MAIL_QUEUE_RUN_SECONDS, and emails of the last batch not
+    yet handed to a connection by then are released for the next run, so a
+    slow server cannot keep the run going past its scheduler lease.
+    """
+    # Only this job sends mail, so web requests that just enqueue never import Flask-Mail
+    from flask_mail import Message
+    from .mailer import SMTPConnectionPool
+
+    with app.app_context():
+        started = time.monotonic()
+        stats = {'sent': 0, 'retried': 0, 'failed': 0, 'released': 0, 'batches': 0}
+        batch_size = app.config['MAIL_QUEUE_BATCH_SIZE']
+        default_sender = app.config['MAIL_DEFAULT_SENDER']
+
+        deadline = started + app.config['MAIL_QUEUE_RUN_SECONDS']
+        claim = timedelta(seconds=app.config['MAIL_QUEUE_LEASE_SECONDS'])
+
+        with SMTPConnectionPool(app, app.config['MAIL_QUEUE_CONCURRENCY']) as pool:
+            while time.monotonic() < deadline:
+                now = datetime.now(timezone.utc)
+                emails = claim_outbox_batch(now, batch_size, now + claim)
+                if not emails:
+                    break
+
+                futures = {}
+                for email in emails:
+                    msg = Message(
+                        subject=email.subject,
+                        sender=email.sender or default_sender,
+                        recipients=email.recipients.split(','),
+                        body=email.body
+                    )
+                    futures[pool.submit(msg)] = email
+                _, late = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+                for future in late:
+                    future.cancel()
+                wait(futures)  # Sends already under way finish within the SMTP timeout
+
+                now = datetime.now(timezone.utc)
+                for future, email in futures.items():
+                    if future.cancelled():
+                        email.next_attempt_at = now  # Release the claim
+                        stats['released'] += 1
+                        continue
+                    email.attempts += 1
+                    error = future.exception()
+                    if error is None:
+                        email.status = 'sent'
+                        email.sent_at = now
+                        email.last_error = None
+                        stats['sent'] += 1
+                    elif email.attempts >= app.config['MAIL_QUEUE_MAX_ATTEMPTS']:
+                        email.status = 'failed'
+                        email.last_error = str(error)
+                        stats['failed'] += 1
+                        app.logger.error(f"Giving up on email {email.id} to {email.recipients}: {error}")
+                    else:
+                        email.next_attempt_at = now + retry_delay(app, email.attempts)
+                        email.last_error = str(error)
+                        stats['retried'] += 1
+                db.session.commit()
+                stats['batches'] += 1
+
+                if len(emails) < batch_size or stats['released']:
+                    break
+
+        stats['elapsed_seconds'] = round(time.monotonic() - started, 3)
+        stats['emails_per_second'] = round(stats['sent'] / stats['elapsed_seconds'], 1) if stats['elapsed_seconds'] else 0.0
+        if stats['batches']:
+            app.logger.info(
+                f"Outbox: {stats['sent']} sent, {stats['retried']} to retry, {stats['failed']} failed, "
+                f"{stats['released']} released "
+                f"in {stats['batches']} batches, {stats['elapsed_seconds']}s ({stats['emails_per_second']} emails/s)."
+            )
+        return stats
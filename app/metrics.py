@@ -0,0 +1,287 @@
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+from flask import current_app, g, request, abort, Response
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from extensions import db
+
+# Request, SQL and job instrumentation. Metrics live in this process and are
+# served in the Prometheus text format from /metrics; each request also gets a
+# Server-Timing header with its own numbers.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+JOB_DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set_total(self, labels, value):
+        """Mirror a counter that is kept elsewhere, such as a cache's hit count."""
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}'
+
+
+class Gauge(Counter):
+    """A value per label set that can go up and down."""
+    kind = 'gauge'
+
+    def set(self, labels, value):
+        self.set_total(labels, value)
+
+
+class Histogram:
+    """Counts of observations per bucket, with their sum, per label set."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            state = self._values.setdefault(labels, [0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(state) for labels, state in self._values.items()}
+        for labels, state in sorted(values.items()):
+            for bound, count in zip(self.buckets, state):
+                bucket_labels = _format_labels(self.labelnames, labels, [('le', _format_number(bound))])
+                yield f'{self.name}_bucket{bucket_labels} {count}'
+            yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", "+Inf")])} {state[-2]}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {state[-2]}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_number(state[-1])}'
+
+
+REQUESTS = Counter('todo_http_requests_total', 'HTTP requests handled.', ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = Histogram('todo_http_request_duration_seconds', 'Wall time of HTTP requests.', ('endpoint',))
+REQUEST_QUERIES = Histogram(
+    'todo_http_request_sql_queries', 'SQL statements per HTTP request.', ('endpoint',), QUERY_COUNT_BUCKETS
+)
+REQUEST_SQL_SECONDS = Histogram('todo_http_request_sql_seconds', 'SQL time per HTTP request.', ('endpoint',))
+REQUEST_TEMPLATE_SECONDS = Histogram(
+    'todo_http_request_template_seconds', 'Template rendering time per HTTP request.', ('endpoint',)
+)
+JOB_RUNS = Counter('todo_job_runs_total', 'Scheduled job runs.', ('job', 'outcome'))
+JOB_SECONDS = Histogram('todo_job_duration_seconds', 'Wall time of job runs.', ('job',), JOB_DURATION_BUCKETS)
+JOB_QUERIES = Counter('todo_job_sql_queries_total', 'SQL statements issued by jobs.', ('job',))
+JOB_SQL_SECONDS = Counter('todo_job_sql_seconds_total', 'SQL time spent by jobs.', ('job',))
+JOB_ITEMS = Counter(
+    'todo_job_items_total', "Items handled by jobs, from each run's statistics "
+    '(todos = rows scanned, digests = emails queued, sent = emails delivered).', ('job', 'item')
+)
+SLOW_QUERIES = Counter('todo_sql_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.', ('scope',))
+CACHE_HITS = Counter('todo_cache_hits_total', 'Cache lookups that found an entry.', ('cache',))
+CACHE_MISSES = Counter('todo_cache_misses_total', 'Cache lookups that found nothing.', ('cache',))
+CACHE_ENTRIES = Gauge('todo_cache_entries', 'Entries held by in-process caches.', ('cache',))
+EVENT_STREAMS = Gauge('todo_event_streams', 'Open live update (SSE) streams served by this process.')
+
+METRICS = (
+    REQUESTS, REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_SQL_SECONDS, REQUEST_TEMPLATE_SECONDS,
+    JOB_RUNS, JOB_SECONDS, JOB_QUERIES, JOB_SQL_SECONDS, JOB_ITEMS, SLOW_QUERIES,
+    CACHE_HITS, CACHE_MISSES, CACHE_ENTRIES, EVENT_STREAMS,
+)
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+# --- Scopes ---
+#
+# A scope is one request or one job run. The SQL and template hooks add to the
+# scope of the thread (or context) they run in; work outside any scope, such
+# as a CLI command, is not measured.
+
+class Scope:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.template_started = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+_current_scope = ContextVar('metrics_scope', default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(app, conn, statement):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.sql_count += 1
+        scope.sql_seconds += elapsed
+    threshold_ms = app.config['SLOW_QUERY_MS']
+    if threshold_ms and elapsed * 1000 >= threshold_ms:
+        name = scope.name if scope is not None else 'unscoped'
+        SLOW_QUERIES.inc((name,))
+        app.logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) in {name}: {' '.join(statement.split())}")
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+def _template_started(sender, template, context, **extra):
+    scope = _current_scope.get()
+    if scope is not None:
+        if scope.template_depth == 0:
+            scope.template_started = time.perf_counter()
+        scope.template_depth += 1
+
+def _template_finished(sender, template, context, **extra):
+    scope = _current_scope.get()
+    if scope is not None and scope.template_depth:
+        scope.template_depth -= 1
+        # Only the outermost render counts, so nested renders are not counted twice
+        if scope.template_depth == 0:
+            scope.template_seconds += time.perf_counter() - scope.template_started
+
+# --- Requests ---
+
+def _start_request():
+    g.metrics_scope = Scope(request.endpoint or 'unmatched')
+    g.metrics_token = _current_scope.set(g.metrics_scope)
+
+def _finish_request(response):
+    scope = g.pop('metrics_scope', None)
+    if scope is None:
+        return response
+    elapsed = scope.elapsed()
+    labels = (scope.name,)
+    REQUESTS.inc((scope.name, request.method, str(response.status_code)))
+    REQUEST_SECONDS.observe(labels, elapsed)
+    REQUEST_QUERIES.observe(labels, scope.sql_count)
+    REQUEST_SQL_SECONDS.observe(labels, scope.sql_seconds)
+    REQUEST_TEMPLATE_SECONDS.observe(labels, scope.template_seconds)
+    if current_app.config['SERVER_TIMING_HEADER']:
+        source = ' on the replica' if g.get('read_replica') else ''
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={scope.sql_seconds * 1000:.1f};desc="{scope.sql_count} queries{source}", '
+            f'tpl;dur={scope.template_seconds * 1000:.1f}'
+        )
+    return response
+
+def _end_request_scope(exception=None):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        _current_scope.reset(token)
+
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not token or not hmac.compare_digest(supplied.encode(), token.encode()):
+        abort(401)
+    for cache_name in ('user_cache', 'page_cache'):
+        cache = current_app.extensions.get(cache_name)
+        if cache is None:
+            continue
+        stats = cache.stats()
+        CACHE_HITS.set_total((cache_name,), stats['hits'])
+        CACHE_MISSES.set_total((cache_name,), stats['misses'])
+        if 'entries' in stats:
+            CACHE_ENTRIES.set((cache_name,), stats['entries'])
+    if 'events' in current_app.extensions:
+        EVENT_STREAMS.set((), current_app.extensions['events'].stats()['streams'])
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# --- Jobs ---
+
+def instrument_job(name, func):
+    """
+    Wrap a job taking the app so each run records its duration, SQL work and
+    the integer counts in the statistics dict it returns.
+    """
+    def run(app):
+        scope = Scope(f'job:{name}')
+        token = _current_scope.set(scope)
+        outcome = 'error'
+        try:
+            stats = func(app)
+            outcome = 'success'
+            return stats
+        finally:
+            _current_scope.reset(token)
+            JOB_RUNS.inc((name, outcome))
+            JOB_SECONDS.observe((name,), scope.elapsed())
+            JOB_QUERIES.inc((name,), scope.sql_count)
+            JOB_SQL_SECONDS.inc((name,), scope.sql_seconds)
+            if outcome == 'success':
+                for item, count in (stats or {}).items():
+                    if isinstance(count, int):
+                        JOB_ITEMS.inc((name, item), count)
+    return run
+
+def init_app(app):
+    if not app.config['METRICS_ENABLED']:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(
+                engine, 'after_cursor_execute',
+                lambda conn, cursor, statement, *args: _after_cursor_execute(app, conn, statement)
+            )
+            event.listen(engine, 'handle_error', _handle_error)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request_scope)
+    # Endpoint names and traffic are nobody else's business: no token, no /metrics
+    if app.config['METRICS_TOKEN']:
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -1,34 +1,81 @@
+from collections import Counter, namedtuple
 from extensions import db
 from datetime import datetime, timezone, timedelta
 from flask_login import UserMixin
-from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
+from .recurrence import parse_rule, describe_rule, occurrences
+from .reminders import DEFAULT_TIMEZONE, next_reminder_at
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(128), nullable=False)
+    # Case-folded copies kept by set_login_keys: sign-in looks users up here,
+    # and their unique indexes reject duplicates that differ only in case
+    username_lower = db.Column(db.String(80), nullable=False, index=True, unique=True)
+    email_lower = db.Column(db.String(120), nullable=False, index=True, unique=True)
+    password = db.Column(db.String(255), nullable=False)  # werkzeug hash, scrypt ones exceed 128 characters
     is_admin = db.Column(db.Boolean, default=False, nullable=False) # Wasn't necessary atm
     todos = db.relationship('Todo', backref='author', lazy='dynamic')
     reset_token = db.Column(db.String(100), nullable=True)
     reset_token_expiration = db.Column(db.DateTime(timezone=True), nullable=True)
+    # Last time any of the user's todos changed; drives ETag/Last-Modified on the todo APIs
+    todos_modified_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    # Incremented with todos_modified_at; keys the cached todo pages (see app/cache.py)
+    todos_version = db.Column(db.Integer, default=0, nullable=False)
+    # IANA name; due dates start at midnight here, which times the reminders
+    timezone = db.Column(db.String(64), default=DEFAULT_TIMEZONE, nullable=False)
 
     def __repr__(self):
         return f'<User {self.username}>'
 
+    @db.validates('username', 'email')
+    def set_login_keys(self, key, value):
+        setattr(self, f'{key}_lower', value.casefold() if value is not None else None)
+        return value
+
+    @staticmethod
+    def find_by_login(identifier):
+        """
+        The user whose email (when identifier contains '@') or username matches
+        identifier, ignoring case. Usernames cannot contain '@', so each lookup
+        is a single probe of one unique index. Like set_login_keys, it keeps
+        surrounding spaces: usernames may have them.
+        """
+        key = identifier.casefold()
+        column = User.email_lower if '@' in key else User.username_lower
+        return db.session.execute(db.select(User).filter(column == key)).scalar_one_or_none()
+
+    def touch_todos(self):
+        """Record that one of this user's todos was created, changed or deleted."""
+        self.todos_modified_at = datetime.now(timezone.utc)
+        # Incremented in SQL so concurrent requests cannot both write the same version
+        self.todos_version = User.todos_version + 1
+        # Live update event, published on commit (see app/events.py)
+        db.session.info.setdefault('todos_touched', set()).add(self.id)
+
+    @property
+    def todos_last_modified(self):
+        """todos_modified_at as an offset-aware UTC datetime (SQLite drops the offset)."""
+        modified = self.todos_modified_at
+        if modified.tzinfo is None or modified.tzinfo.utcoffset(modified) is None:
+            modified = modified.replace(tzinfo=timezone.utc)
+        return modified
+
     def get_reset_token(self, expires_sec=1800):
+        from itsdangerous import URLSafeTimedSerializer  # Only password resets need it
         s = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
         token = s.dumps({'user_id': self.id})
         self.reset_token = token
         # Store as offset-aware datetime in UTC
         self.reset_token_expiration = datetime.now(timezone.utc) + timedelta(seconds=expires_sec)
-        db.session.commit()
+        # The caller commits, together with the email carrying the token
         return token
 
     @staticmethod
     def verify_reset_token(token):
+        from itsdangerous import URLSafeTimedSerializer
         s = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
         try:
             data = s.loads(token, max_age=1800) # itsdangerous handles expiration check here
@@ -61,6 +108,82 @@ class User(UserMixin, db.Model):
         return user
 
 
+def parse_tags(text):
+    """Split a comma-separated tag string into unique, lower-cased tag names, in order."""
+    names = []
+    for part in (text or '').split(','):
+        name = ' '.join(part.split()).lower()[:50]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+# Association between todos and their normalized tags
+todo_tags = db.Table(
+    'todo_tags',
+    db.Column('todo_id', db.Integer, db.ForeignKey('todos.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key serves todo -> tags; this serves tag -> todos
+    db.Index('ix_todo_tags_tag_todo', 'tag_id', 'todo_id'),
+)
+
+
+class Tag(db.Model):
+    __tablename__ = 'tags'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'name', name='uq_tags_user_name'),
+    )
+
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+    @staticmethod
+    def resolve(user_id, names):
+        """Return the user's Tag rows for the given names, creating the missing ones."""
+        if not names:
+            return []
+        existing = {
+            tag.name: tag for tag in db.session.execute(
+                db.select(Tag).filter(Tag.user_id == user_id, Tag.name.in_(names))
+            ).scalars()
+        }
+        tags = []
+        for name in names:
+            tag = existing.get(name)
+            if tag is None:
+                tag = Tag(user_id=user_id, name=name)
+                db.session.add(tag)
+            tags.append(tag)
+        return tags
+
+
+class CompletionStat(db.Model):
+    """Number of todos a user completed in a month, maintained as todos change status."""
+    __tablename__ = 'completion_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # 'YYYY-MM'
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<CompletionStat {self.user_id} {self.month}: {self.count}>'
+
+    @staticmethod
+    def adjust(user_id, completed_at, delta):
+        """Add delta to the counter of the month completed_at falls in, in the current transaction."""
+        month = completed_at.strftime('%Y-%m')
+        result = db.session.execute(
+            db.update(CompletionStat)
+            .where(CompletionStat.user_id == user_id, CompletionStat.month == month)
+            .values(count=CompletionStat.count + delta)
+        )
+        if result.rowcount == 0 and delta > 0:
+            db.session.add(CompletionStat(user_id=user_id, month=month, count=delta))
+
+
 class Todo(db.Model):
     __tablename__ = 'todos'
     id = db.Column(db.Integer, primary_key=True)
@@ -70,8 +193,371 @@ class Todo(db.Model):
     due_date = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     # Fields for categories/tags and priority
-    tags = db.Column(db.String(255), nullable=True)  # Stores comma-separated tags
+    tags = db.Column(db.String(255), nullable=True)  # Comma-separated display copy of tag_objects
     priority = db.Column(db.String(20), default='medium', nullable=False) # 'low', 'medium', 'high'
+    # When the next reminder is due (UTC), kept by schedule_reminder; None
+    # when no reminder is pending. The reminder job reads it by range.
+    next_reminder_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    completed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    # RRULE subset (see app/recurrence.py) repeating the todo from its due date
+    recurrence = db.Column(db.String(100), nullable=True)
+    # Last change a client can see; drives the delta sync API. Nullable only
+    # because the column was added to an existing table (see its migration).
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=True
+    )
+    tag_objects = db.relationship('Tag', secondary=todo_tags, order_by='Tag.name', backref=db.backref('todos', lazy='dynamic'))
+
+    # Composite indexes matching the hot queries in app/queries.py
+    __table_args__ = (
+        db.Index('ix_todos_user_status_created', 'user_id', 'status', 'created_at', 'id'),
+        db.Index('ix_todos_user_status_due', 'user_id', 'status', 'due_date'),
+        db.Index('ix_todos_status_due', 'status', 'due_date'),
+        db.Index('ix_todos_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_todos_next_reminder', 'next_reminder_at'),
+        # Partial: only the (few) repeating todos, for expanding their occurrences
+        db.Index(
+            'ix_todos_recurring', 'status', 'user_id', 'due_date', 'id',
+            sqlite_where=db.text('recurrence IS NOT NULL'), postgresql_where=db.text('recurrence IS NOT NULL')
+        ),
+        # Ids are never handed out twice, so an archived todo keeps its id to itself
+        {'sqlite_autoincrement': True},
+    )
+
+    def __repr__(self):
+        return f'<Todo {self.description}>'
+
+    def to_dict(self):
+        """JSON-friendly representation used by the todo APIs."""
+        return {
+            'id': self.id,
+            'description': self.description,
+            'status': self.status,
+            'priority': self.priority,
+            'due_date': self.due_date.date().isoformat() if self.due_date else None,
+            'tags': [tag.name for tag in self.tag_objects],
+            'recurrence': self.recurrence,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def set_status(self, status):
+        """Change the status, keeping completed_at and the monthly completion counters in step."""
+        if status == self.status:
+            return
+        if self.status == 'complete':
+            CompletionStat.adjust(self.user_id, self.completed_at or self.created_at, -1)
+            self.completed_at = None
+        if status == 'complete':
+            self.completed_at = datetime.now(timezone.utc)
+            CompletionStat.adjust(self.user_id, self.completed_at, 1)
+            self.next_reminder_at = None
+        self.status = status
+
+    def delete(self):
+        """
+        Delete this todo, taking it out of the completion counters if it was
+        complete and leaving a tombstone for clients that sync changes.
+        """
+        if self.status == 'complete':
+            CompletionStat.adjust(self.user_id, self.completed_at or self.created_at, -1)
+        TodoTombstone.record(self.user_id, [self.id])
+        RecurrenceException.forget([self.id])
+        db.session.delete(self)
+
+    @property
+    def rule(self):
+        """The parsed recurrence, or None for a one-off todo."""
+        return parse_rule(self.recurrence) if self.recurrence else None
+
+    @property
+    def repeats(self):
+        """How the todo repeats in words, or None for a one-off todo."""
+        return describe_rule(self.rule) if self.recurrence else None
+
+    def completed_occurrences(self):
+        """The dates of the completed occurrences of a repeating todo."""
+        if self.id is None:
+            return set()
+        return set(db.session.execute(
+            db.select(RecurrenceException.occurrence).filter_by(todo_id=self.id)
+        ).scalars())
+
+    def next_occurrence(self):
+        """The first occurrence of a repeating todo not completed yet, or None once the series is over."""
+        completed = self.completed_occurrences()
+        for day in occurrences(self.rule, self.due_date.date()):
+            if day not in completed:
+                return day
+        return None
+
+    def complete_occurrence(self, day):
+        """
+        Complete one occurrence of a repeating todo, and the todo itself once
+        no occurrence is left, in the current transaction.
+        """
+        now = datetime.now(timezone.utc)
+        db.session.add(RecurrenceException(todo_id=self.id, occurrence=day, completed_at=now))
+        # The row is otherwise unchanged, but syncing clients must fetch it again
+        self.updated_at = now
+        db.session.flush()
+        if self.next_occurrence() is None:
+            self.set_status('complete')
+        else:
+            self.schedule_reminder()
+
+    def schedule_reminder(self, zone_name=None):
+        """
+        Set next_reminder_at from the todo's current fields, in the author's
+        timezone unless zone_name is given. Call it after changing the due
+        date, status or rule.
+        """
+        if zone_name is None:
+            zone_name = db.session.get(User, self.user_id).timezone
+        completed = self.completed_occurrences() if self.recurrence and self.status == 'pending' else ()
+        self.next_reminder_at = next_reminder_at(self.due_date, self.status, self.recurrence, zone_name, completed)
+
+    @staticmethod
+    def set_reminder_times(times):
+        """
+        Store next_reminder_at for many todos from {todo_id: moment or None},
+        with one executemany. Clients never see the column, so updated_at is
+        left alone and this is not a change to sync.
+        """
+        if not times:
+            return
+        table = Todo.__table__
+        db.session.execute(
+            db.update(table)
+            .where(table.c.id == db.bindparam('todo_id'))
+            .values(next_reminder_at=db.bindparam('reminder_at'), updated_at=table.c.updated_at),
+            [{'todo_id': todo_id, 'reminder_at': moment} for todo_id, moment in times.items()]
+        )
+
+    @staticmethod
+    def reschedule_reminders(user_id, zone_name, batch_size=1000):
+        """Recompute next_reminder_at for every pending dated todo of a user, e.g. after a timezone change."""
+        rows = db.session.execute(
+            db.select(Todo.id, Todo.due_date, Todo.recurrence)
+            .filter(Todo.user_id == user_id, Todo.status == 'pending', Todo.due_date.isnot(None))
+        ).all()
+        completed = {}
+        repeating = [row.id for row in rows if row.recurrence]
+        for start in range(0, len(repeating), batch_size):
+            for todo_id, day in db.session.execute(
+                db.select(RecurrenceException.todo_id, RecurrenceException.occurrence)
+                .filter(RecurrenceException.todo_id.in_(repeating[start:start + batch_size]))
+            ):
+                completed.setdefault(todo_id, set()).add(day)
+        Todo.set_reminder_times({
+            row.id: next_reminder_at(row.due_date, 'pending', row.recurrence, zone_name, completed.get(row.id, ()))
+            for row in rows
+        })
+
+    def set_tags(self, text):
+        """Replace this todo's tags with those in a comma-separated string."""
+        names = parse_tags(text)
+        self.tag_objects = Tag.resolve(self.user_id, names)
+        self.tags = ', '.join(names) or None
+
+    @staticmethod
+    def link_tags(user_id, tag_names_by_id):
+        """Replace the tags of several todos at once, from {todo_id: [tag names]}."""
+        all_names = list(dict.fromkeys(name for names in tag_names_by_id.values() for name in names))
+        tags = Tag.resolve(user_id, all_names)
+        db.session.flush()  # Gives new tags their ids
+        tag_ids = {tag.name: tag.id for tag in tags}
+
+        db.session.execute(db.delete(todo_tags).where(todo_tags.c.todo_id.in_(list(tag_names_by_id))))
+        links = [
+            {'todo_id': todo_id, 'tag_id': tag_ids[name]}
+            for todo_id, names in tag_names_by_id.items() for name in names
+        ]
+        if links:
+            db.session.execute(db.insert(todo_tags), links)
+
+    @staticmethod
+    def insert_many(user_id, items):
+        """
+        Insert todos from dicts of validated fields, keeping tags and completion
+        counters in step, in the current transaction. created_at and
+        completed_at are taken from the dicts when given. Returns the new ids
+        in ascending order.
+        """
+        now = datetime.now(timezone.utc)
+        zone_name = None
+        if any(values.get('due_date') for values in items):
+            zone_name = db.session.get(User, user_id).timezone
+        rows = []
+        for values in items:
+            complete = values.get('status') == 'complete'
+            rows.append({
+                'user_id': user_id,
+                'description': values['description'],
+                'due_date': values.get('due_date'),
+                'status': values.get('status', 'pending'),
+                'priority': values.get('priority', 'medium'),
+                'tags': ', '.join(parse_tags(values.get('tags'))) or None,
+                'recurrence': values.get('recurrence'),
+                'created_at': values.get('created_at') or now,
+                'completed_at': (values.get('completed_at') or now) if complete else None,
+                'next_reminder_at': next_reminder_at(
+                    values.get('due_date'), values.get('status', 'pending'), values.get('recurrence'), zone_name
+                ),
+            })
+
+        # A Core insert keeps the batch whole (the ORM splits it wherever a value
+        # turns None). Asking for RETURNING in parameter order would make SQLite
+        # insert row by row, so the tag links come from each returned tags column.
+        created = db.session.execute(db.insert(Todo.__table__).returning(Todo.id, Todo.tags), rows).all()
+        tagged = {row.id: parse_tags(row.tags) for row in created if row.tags}
+        if tagged:
+            Todo.link_tags(user_id, tagged)
+
+        months = Counter(
+            datetime(row['completed_at'].year, row['completed_at'].month, 1)
+            for row in rows if row['completed_at']
+        )
+        for month, count in months.items():
+            CompletionStat.adjust(user_id, month, count)
+        return sorted(row.id for row in created)
+
+
+# Stands in for a Tag where only the name is kept, e.g. on archived todos
+TagName = namedtuple('TagName', 'name')
+
+
+class ArchivedTodo(db.Model):
+    """
+    A completed todo moved out of the live table by the archive job
+    (app/tasks.py). Keeps its id, so it can be restored under the same URL.
+    Tags survive only as the display copy in `tags`.
+    """
+    __tablename__ = 'todos_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    description = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    due_date = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    tags = db.Column(db.String(255), nullable=True)
+    priority = db.Column(db.String(20), nullable=False)
+    completed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    recurrence = db.Column(db.String(100), nullable=True)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    archived_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_todos_archive_user_created', 'user_id', 'created_at', 'id'),
+    )
+
+    # Columns copied from todos when archiving
+    COPIED_COLUMNS = (
+        'id', 'user_id', 'description', 'status', 'due_date', 'created_at',
+        'tags', 'priority', 'completed_at', 'recurrence', 'updated_at',
+    )
+
+    def __repr__(self):
+        return f'<ArchivedTodo {self.description}>'
+
+    @property
+    def tag_objects(self):
+        """The tags as name-only objects, so templates can treat archived and live todos alike."""
+        return [TagName(name) for name in parse_tags(self.tags)]
+
+    def restore(self):
+        """
+        Move this todo back into the live table as pending, under its old id,
+        and return the new Todo.
+        """
+        # updated_at is left to its default: syncing clients must see the todo come back
+        todo = Todo(**{
+            column: getattr(self, column)
+            for column in self.COPIED_COLUMNS if column not in ('tags', 'updated_at')
+        })
+        db.session.add(todo)
+        todo.set_tags(self.tags)
+        todo.set_status('pending')
+        todo.schedule_reminder()
+        db.session.delete(self)
+        return todo
+
+
+class RecurrenceException(db.Model):
+    """A completed occurrence of a repeating todo; the todo itself stays pending."""
+    __tablename__ = 'recurrence_exceptions'
+    todo_id = db.Column(db.Integer, db.ForeignKey('todos.id', ondelete='CASCADE'), primary_key=True)
+    occurrence = db.Column(db.Date, primary_key=True)
+    completed_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f'<RecurrenceException {self.todo_id} {self.occurrence}>'
+
+    @staticmethod
+    def forget(todo_ids):
+        """Delete the exceptions of todos deleted in the current transaction, or whose rule changed."""
+        # SQLite does not enforce ON DELETE CASCADE unless asked to
+        db.session.execute(db.delete(RecurrenceException).where(RecurrenceException.todo_id.in_(todo_ids)))
+
+
+class TodoTombstone(db.Model):
+    """Records a deleted todo so clients syncing changes learn to drop it."""
+    __tablename__ = 'todo_tombstones'
+    id = db.Column(db.Integer, primary_key=True)
+    todo_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    deleted_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_todo_tombstones_user_deleted', 'user_id', 'deleted_at', 'todo_id'),
+    )
+
+    def __repr__(self):
+        return f'<TodoTombstone {self.todo_id}>'
+
+    @staticmethod
+    def record(user_id, todo_ids):
+        """Add tombstones for todos deleted in the current transaction."""
+        now = datetime.now(timezone.utc)
+        db.session.execute(
+            db.insert(TodoTombstone),
+            [{'todo_id': todo_id, 'user_id': user_id, 'deleted_at': now} for todo_id in todo_ids]
+        )
+
+
+class JobLease(db.Model):
+    """Time-limited lock that lets a single process run a scheduled job."""
+    __tablename__ = 'job_leases'
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f'<JobLease {self.name} held by {self.owner}>'
+
+
+
+class OutboundEmail(db.Model):
+    """An email waiting in (or delivered from) the outbox drained by the scheduler."""
+    __tablename__ = 'mail_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(120), nullable=True)  # None means MAIL_DEFAULT_SENDER
+    recipients = db.Column(db.Text, nullable=False)  # Comma-separated addresses
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False) # 'pending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_mail_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
 
     def __repr__(self):
-        return f'<Todo {self.description}>'
\ No newline at end of file
+        return f'<OutboundEmail {self.id} {self.status}>'
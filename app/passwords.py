@@ -0,0 +1,67 @@
+import atexit
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing is deliberately slow and holds the GIL while it runs, so it
+# is done in a small pool of worker processes: the request thread just waits
+# on the result, and the worker's other threads keep serving requests.
+#
+# The pool starts on first use, when the process already runs threads (the
+# request threads, the SSE streams, the scheduler). Forking then can copy a
+# lock some other thread held and deadlock the child, so its processes are
+# started by a forkserver (spawned where there is none) instead.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _start_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def _pool():
+    """The hashing process pool, started on first use in each process (None when disabled)."""
+    global _executor
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if workers <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=_start_context())
+            atexit.register(shutdown)
+        return _executor
+
+def shutdown():
+    """Stop the hashing processes; the pool is started again on next use."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+def _run(func, *args, **kwargs):
+    pool = _pool()
+    if pool is None:
+        return func(*args, **kwargs)
+    return pool.submit(func, *args, **kwargs).result()
+
+def hash_password(password):
+    """Hash a password with the configured PASSWORD_HASH_METHOD."""
+    return _run(generate_password_hash, password, method=current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(password_hash, password):
+    """Check a password against a stored werkzeug hash."""
+    return _run(check_password_hash, password_hash, password)
+
+@functools.lru_cache(maxsize=None)
+def _stored_method(method):
+    # werkzeug fills in default parameters ('scrypt' is stored as 'scrypt:32768:8:1');
+    # finding out takes a full hash, so it runs in the pool like any other
+    return _run(generate_password_hash, '', method=method).split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    """True when a stored hash was made with other parameters than PASSWORD_HASH_METHOD."""
+    return password_hash.split('$', 1)[0] != _stored_method(current_app.config['PASSWORD_HASH_METHOD'])
@@ -0,0 +1,287 @@
+import base64
+from datetime import datetime
+from extensions import db
+from .models import Todo, User, Tag, CompletionStat, TodoTombstone, ArchivedTodo, RecurrenceException, todo_tags
+
+# The statements behind the hot pages and jobs live here so that the routes,
+# the reminder task and `flask check-indexes` all run exactly the same SQL.
+#
+# Statuses are only ever 'pending' or 'complete' (see TodoForm), so "not
+# complete" is written as status == 'pending': an equality keeps the
+# composite indexes usable all the way to their last column.
+
+def dashboard_todos(user_id):
+    """Pending todos for the dashboard, newest first, with their tags."""
+    return (
+        db.select(Todo)
+        .filter(Todo.user_id == user_id, Todo.status == 'pending')
+        .order_by(Todo.created_at.desc(), Todo.id.desc())
+        .options(db.selectinload(Todo.tag_objects))
+    )
+
+def calendar_todos(user_id, window_start=None, window_end=None):
+    """
+    Pending todos due inside the visible calendar window, oldest first.
+
+    Only the columns the feed renders are selected. Without a window every
+    dated pending todo is returned.
+    """
+    stmt = (
+        db.select(Todo.id, Todo.description, Todo.due_date, Todo.status, Todo.tags, Todo.priority)
+        .filter(
+            Todo.user_id == user_id, Todo.status == 'pending', Todo.due_date.isnot(None),
+            Todo.recurrence.is_(None)  # Repeating todos come from recurring_todos
+        )
+        .order_by(Todo.due_date.asc())
+    )
+    if window_start is not None:
+        stmt = stmt.filter(Todo.due_date >= window_start)
+    if window_end is not None:
+        stmt = stmt.filter(Todo.due_date < window_end)
+    return stmt
+
+def recurring_todos(user_id, window_end):
+    """
+    Pending repeating todos whose series starts before window_end, to be
+    expanded into the occurrences of a window. Read from the partial
+    ix_todos_recurring index, so one-off todos are never visited.
+    """
+    return (
+        db.select(
+            Todo.id, Todo.description, Todo.due_date, Todo.status, Todo.tags, Todo.priority, Todo.recurrence
+        )
+        .filter(
+            Todo.user_id == user_id,
+            Todo.recurrence.isnot(None),
+            Todo.due_date < window_end,
+            Todo.status == 'pending'
+        )
+        .order_by(Todo.due_date, Todo.id)
+    )
+
+def completed_occurrences(todo_ids, first_day, end_day):
+    """(todo_id, occurrence) of the completed occurrences of some todos in [first_day, end_day)."""
+    return (
+        db.select(RecurrenceException.todo_id, RecurrenceException.occurrence)
+        .filter(
+            RecurrenceException.todo_id.in_(todo_ids),
+            RecurrenceException.occurrence >= first_day,
+            RecurrenceException.occurrence < end_day
+        )
+    )
+
+def completed_todos(user_id):
+    """Completed todos for the history page, newest first, with their tags."""
+    return (
+        db.select(Todo)
+        .filter(Todo.user_id == user_id, Todo.status == 'complete')
+        .order_by(Todo.created_at.desc(), Todo.id.desc())
+        .options(db.selectinload(Todo.tag_objects))
+    )
+
+def archived_todos(user_id):
+    """Archived (completed) todos for the history page, newest first."""
+    return (
+        db.select(ArchivedTodo)
+        .filter(ArchivedTodo.user_id == user_id)
+        .order_by(ArchivedTodo.created_at.desc(), ArchivedTodo.id.desc())
+    )
+
+def archivable_todos(cutoff, batch_size):
+    """
+    Ids of up to batch_size todos completed before cutoff, lowest first.
+    Archived ids are never handed out again (todos uses AUTOINCREMENT on SQLite).
+    """
+    return (
+        db.select(Todo.id)
+        .filter(Todo.status == 'complete', Todo.completed_at < cutoff)
+        .order_by(Todo.id)
+        .limit(batch_size)
+    )
+
+def todos_by_tag(user_id, tag_name):
+    """
+    Every todo of the user carrying a tag, newest first.
+
+    Resolved through the (user_id, name) unique index on tags and the
+    (tag_id, todo_id) index on todo_tags rather than a LIKE over Todo.tags.
+    """
+    return (
+        db.select(Todo)
+        .join(todo_tags, todo_tags.c.todo_id == Todo.id)
+        .join(Tag, Tag.id == todo_tags.c.tag_id)
+        .filter(Tag.user_id == user_id, Tag.name == tag_name)
+        .order_by(Todo.created_at.desc(), Todo.id.desc())
+        .options(db.selectinload(Todo.tag_objects))
+    )
+
+def tag_counts(user_id):
+    """(name, todo count) for each of the user's tags in use, most used first."""
+    count = db.func.count(todo_tags.c.todo_id)
+    return (
+        db.select(Tag.name, count.label('count'))
+        .join(todo_tags, todo_tags.c.tag_id == Tag.id)
+        .filter(Tag.user_id == user_id)
+        .group_by(Tag.id, Tag.name)
+        .order_by(count.desc(), Tag.name)
+    )
+
+def due_reminders(now):
+    """
+    Pending todos of every user whose next reminder is due at or before now,
+    joined with their author (and the author's timezone) so no per-row lazy
+    load is needed.
+
+    The ix_todos_next_reminder range scan only reaches the rows that came due
+    since the previous run. Rows come back grouped by user, ordered by
+    (user_id, id), which is also the key the reminder task resumes from
+    between chunks.
+    """
+    return (
+        db.select(
+            Todo.id, Todo.user_id, Todo.description, Todo.due_date, Todo.status, Todo.tags,
+            Todo.priority, Todo.recurrence, Todo.next_reminder_at, User.username, User.email, User.timezone
+        )
+        .join(User, Todo.user_id == User.id)
+        # Only pending todos have a next_reminder_at, so status is not tested:
+        # an equality on it would lure the planner onto ix_todos_status_due
+        .filter(Todo.next_reminder_at.isnot(None), Todo.next_reminder_at <= now)
+        .order_by(Todo.user_id, Todo.id)
+    )
+
+def completed_by_month(user_id):
+    """('YYYY-MM', count) rows from the user's maintained completion counters."""
+    return (
+        db.select(CompletionStat.month, CompletionStat.count)
+        .filter(CompletionStat.user_id == user_id, CompletionStat.count > 0)
+    )
+
+# --- Delta sync ---
+
+def todo_changes(user_id, since=None):
+    """
+    The user's todos created or changed after the (updated_at, id) key `since`,
+    oldest change first, read from ix_todos_user_updated.
+    """
+    stmt = (
+        db.select(Todo)
+        .filter(Todo.user_id == user_id)
+        .order_by(Todo.updated_at, Todo.id)
+    )
+    if since is not None:
+        stmt = stmt.filter(db.tuple_(Todo.updated_at, Todo.id) > since)
+    return stmt
+
+def todo_deletions(user_id, since):
+    """The user's tombstones after the (deleted_at, todo_id) key `since`, oldest first."""
+    return (
+        db.select(TodoTombstone.todo_id, TodoTombstone.deleted_at)
+        .filter(
+            TodoTombstone.user_id == user_id,
+            db.tuple_(TodoTombstone.deleted_at, TodoTombstone.todo_id) > since
+        )
+        .order_by(TodoTombstone.deleted_at, TodoTombstone.todo_id)
+    )
+
+def encode_sync_cursor(key, issued_at):
+    """
+    Opaque delta sync cursor: the (timestamp, id) key of the last change sent
+    and when the cursor was handed out, which is what tombstone expiry is
+    checked against.
+    """
+    raw = f'{key[0].isoformat()}|{key[1]}|{issued_at.isoformat()}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_sync_cursor(cursor):
+    """Inverse of encode_sync_cursor: ((timestamp, id), issued_at), or None if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        moment, row_id, issued_at = base64.urlsafe_b64decode(padded).decode().split('|')
+        return (datetime.fromisoformat(moment), int(row_id)), datetime.fromisoformat(issued_at)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+# --- Keyset pagination ---
+
+def encode_cursor(todo):
+    """Opaque cursor pointing at a todo's (created_at, id) position."""
+    raw = f'{todo.created_at.isoformat()}|{todo.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Returns None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, todo_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(todo_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+class KeysetPage:
+    """One page of todos plus the cursors of its neighbouring pages."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def keyset_page(stmt, per_page, after=None, before=None):
+    """
+    Fetch one page of a statement ordered newest first by (created_at, id).
+
+    `after` continues towards older todos and `before` goes back towards newer
+    ones. Only per_page + 1 rows are read from the index, so the cost of a page
+    does not depend on how many todos the user has.
+
+    stmt may also be a list of such statements over different tables (live
+    and archived todos); each is read the same way and the rows are merged.
+    """
+    stmts = stmt if isinstance(stmt, list) else [stmt]
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    def fetch(stmt, newer_than=None, older_than=None):
+        entity = stmt.column_descriptions[0]['entity']
+        key = db.tuple_(entity.created_at, entity.id)
+        if newer_than is not None:
+            stmt = (
+                stmt.filter(key > newer_than)
+                .order_by(None)
+                .order_by(entity.created_at.asc(), entity.id.asc())
+            )
+        elif older_than is not None:
+            stmt = stmt.filter(key < older_than)
+        return db.session.execute(stmt.limit(per_page + 1)).scalars().all()
+
+    def merged(newer_than=None, older_than=None):
+        rows = [row for stmt in stmts for row in fetch(stmt, newer_than, older_than)]
+        rows.sort(key=lambda row: (row.created_at, row.id), reverse=newer_than is None)
+        return rows[:per_page + 1]
+
+    if before is not None:
+        rows = merged(newer_than=before)
+        has_newer = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPage(
+            items,
+            next_cursor=encode_cursor(items[-1]) if items else None,
+            prev_cursor=encode_cursor(items[0]) if items and has_newer else None
+        )
+
+    rows = merged(older_than=after)
+    has_older = len(rows) > per_page
+    items = rows[:per_page]
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1]) if items and has_older else None,
+        prev_cursor=encode_cursor(items[0]) if items and after is not None else None
+    )
@@ -0,0 +1,222 @@
+import calendar
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta, timezone
+
+# Repeating todos. A todo's `recurrence` holds a subset of the iCalendar RRULE
+# syntax (RFC 5545), such as "FREQ=WEEKLY;BYDAY=MO" or
+# "FREQ=MONTHLY;BYMONTHDAY=1,15;COUNT=12", and its due date is the first
+# occurrence. Occurrences are never stored: they are computed for the window
+# that is asked for, so one row stands in for an unbounded series.
+#
+# Supported parts: FREQ (DAILY, WEEKLY, MONTHLY, YEARLY), INTERVAL, BYDAY
+# (weekly only, MO..SU), BYMONTHDAY (monthly only, 1..31 or -1 for the last
+# day), and at most one of COUNT and UNTIL (YYYYMMDD, inclusive).
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+FREQUENCY_UNITS = {'DAILY': 'day', 'WEEKLY': 'week', 'MONTHLY': 'month', 'YEARLY': 'year'}
+MAX_INTERVAL = 1000
+MAX_COUNT = 1000
+# Periods in a row without an occurrence (BYMONTHDAY=31 every 12 months from
+# a 30-day month, say) after which a series is taken to be over
+MAX_EMPTY_PERIODS = 1000
+
+Rule = namedtuple('Rule', 'freq interval byday bymonthday count until')
+
+def parse_rule(text):
+    """
+    Parse recurrence text into a Rule. Raises ValueError with a message fit
+    for the user when the text is outside the supported subset.
+    """
+    text = text.strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+    parts = {}
+    for part in filter(None, text.upper().split(';')):
+        name, sep, value = part.partition('=')
+        if not sep or not value:
+            raise ValueError(f'Expected NAME=VALUE, got "{part}".')
+        if name in parts:
+            raise ValueError(f'{name} is given twice.')
+        parts[name] = value
+
+    unknown = set(parts) - {'FREQ', 'INTERVAL', 'BYDAY', 'BYMONTHDAY', 'COUNT', 'UNTIL'}
+    if unknown:
+        raise ValueError(f"Unsupported part: {', '.join(sorted(unknown))}.")
+    freq = parts.get('FREQ')
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}.")
+
+    interval = _parse_int(parts.get('INTERVAL', '1'), 'INTERVAL', 1, MAX_INTERVAL)
+
+    byday = ()
+    if 'BYDAY' in parts:
+        if freq != 'WEEKLY':
+            raise ValueError('BYDAY is only supported with FREQ=WEEKLY.')
+        days = parts['BYDAY'].split(',')
+        if any(day not in WEEKDAYS for day in days):
+            raise ValueError(f"BYDAY takes {', '.join(WEEKDAYS)}.")
+        byday = tuple(sorted({WEEKDAYS.index(day) for day in days}))
+
+    bymonthday = ()
+    if 'BYMONTHDAY' in parts:
+        if freq != 'MONTHLY':
+            raise ValueError('BYMONTHDAY is only supported with FREQ=MONTHLY.')
+        days = {_parse_int(day, 'BYMONTHDAY', -1, 31) for day in parts['BYMONTHDAY'].split(',')}
+        if 0 in days:
+            raise ValueError('BYMONTHDAY takes 1 to 31, or -1 for the last day of the month.')
+        bymonthday = tuple(sorted(days, key=lambda day: 32 if day == -1 else day))
+
+    if 'COUNT' in parts and 'UNTIL' in parts:
+        raise ValueError('Give COUNT or UNTIL, not both.')
+    count = _parse_int(parts['COUNT'], 'COUNT', 1, MAX_COUNT) if 'COUNT' in parts else None
+    until = None
+    if 'UNTIL' in parts:
+        value = parts['UNTIL']
+        try:
+            if len(value) != 8 or not value.isdigit():
+                raise ValueError
+            until = date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+        except ValueError:
+            raise ValueError('UNTIL must be a date written YYYYMMDD.') from None
+
+    return Rule(freq, interval, byday, bymonthday, count, until)
+
+def _parse_int(value, name, low, high):
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a whole number.') from None
+    if not low <= number <= high:
+        raise ValueError(f'{name} must be between {low} and {high}.')
+    return number
+
+def format_rule(rule):
+    """The canonical text of a Rule, as stored in todos.recurrence."""
+    parts = [f'FREQ={rule.freq}']
+    if rule.interval != 1:
+        parts.append(f'INTERVAL={rule.interval}')
+    if rule.byday:
+        parts.append('BYDAY=' + ','.join(WEEKDAYS[day] for day in rule.byday))
+    if rule.bymonthday:
+        parts.append('BYMONTHDAY=' + ','.join(str(day) for day in rule.bymonthday))
+    if rule.count is not None:
+        parts.append(f'COUNT={rule.count}')
+    if rule.until is not None:
+        parts.append(f'UNTIL={rule.until:%Y%m%d}')
+    return ';'.join(parts)
+
+def normalize_rule(text):
+    """Canonical recurrence text for user input, or None for blank input. Raises ValueError."""
+    if not text or not text.strip():
+        return None
+    return format_rule(parse_rule(text))
+
+def describe_rule(rule):
+    """A short English description, e.g. "Every 2 weeks on Monday, Friday"."""
+    unit = FREQUENCY_UNITS[rule.freq]
+    text = f'Every {unit}' if rule.interval == 1 else f'Every {rule.interval} {unit}s'
+    if rule.byday:
+        text += ' on ' + ', '.join(WEEKDAY_NAMES[day] for day in rule.byday)
+    if rule.bymonthday:
+        text += ' on day ' + ', '.join('last' if day == -1 else str(day) for day in rule.bymonthday)
+    if rule.count is not None:
+        text += f', {rule.count} times'
+    if rule.until is not None:
+        text += f', until {rule.until.isoformat()}'
+    return text
+
+# --- Expansion ---
+
+def _add_months(year, month, months):
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+def _period_dates(rule, start, period):
+    """The candidate dates of the period-th period (0 = the one holding start), in order."""
+    step = period * rule.interval
+    if rule.freq == 'DAILY':
+        return [start + timedelta(days=step)]
+    if rule.freq == 'WEEKLY':
+        week_start = start - timedelta(days=start.weekday()) + timedelta(weeks=step)
+        return [week_start + timedelta(days=day) for day in rule.byday or (start.weekday(),)]
+    if rule.freq == 'MONTHLY':
+        year, month = _add_months(start.year, start.month, step)
+        last_day = calendar.monthrange(year, month)[1]
+        days = [last_day if day == -1 else day for day in rule.bymonthday or (start.day,)]
+        # A day the month does not have (the 31st in April) is skipped, as RFC 5545 says
+        return sorted(date(year, month, day) for day in set(days) if day <= last_day)
+    year = start.year + step
+    if start.month == 2 and start.day == 29 and not calendar.isleap(year):
+        return []
+    return [start.replace(year=year)]
+
+def _first_period(rule, start, window_start):
+    """A period at or before the one holding window_start, so the periods before it can be skipped."""
+    if window_start is None or window_start <= start or rule.count is not None:
+        # COUNT is counted from the first occurrence, so nothing can be skipped
+        return 0
+    if rule.freq == 'DAILY':
+        elapsed = (window_start - start).days
+    elif rule.freq == 'WEEKLY':
+        elapsed = (window_start - start).days // 7
+    elif rule.freq == 'MONTHLY':
+        elapsed = (window_start.year - start.year) * 12 + window_start.month - start.month
+    else:
+        elapsed = window_start.year - start.year
+    return max(elapsed // rule.interval - 1, 0)
+
+def occurrences(rule, start, window_start=None, window_end=None):
+    """
+    Yield the dates of the series starting on start that fall in
+    [window_start, window_end), in order. Without window_end the series is
+    followed until COUNT or UNTIL ends it, so leave it out only for bounded
+    series or stop iterating yourself.
+    """
+    period = _first_period(rule, start, window_start)
+    seen = 0
+    empty_periods = 0
+    while empty_periods < MAX_EMPTY_PERIODS:
+        try:
+            dates = _period_dates(rule, start, period)
+        except (ValueError, OverflowError):
+            return  # Past year 9999
+        period += 1
+        empty_periods = 0 if dates else empty_periods + 1
+        for day in dates:
+            if day < start:
+                continue
+            if rule.until is not None and day > rule.until:
+                return
+            if window_end is not None and day >= window_end:
+                return
+            seen += 1
+            if window_start is None or day >= window_start:
+                yield day
+            if rule.count is not None and seen >= rule.count:
+                return
+
+def day_window(window_start, window_end, max_days):
+    """
+    The dates [first, end) whose midnight falls in a window of naive
+    datetimes, as due dates are stored. A missing start means today (UTC);
+    the window is cut to max_days so no request expands a series forever.
+    """
+    def first_midnight(moment):
+        return moment.date() if moment.time() == time() else moment.date() + timedelta(days=1)
+
+    first = first_midnight(window_start) if window_start is not None else datetime.now(timezone.utc).date()
+    end = first_midnight(window_end) if window_end is not None else first + timedelta(days=max_days)
+    return first, min(end, first + timedelta(days=max_days))
+
+def open_occurrences(series, first_day, end_day, completed):
+    """
+    Yield (row, date) for each occurrence in [first_day, end_day) of the
+    repeating todo rows in series (with `id`, `due_date` and `recurrence`)
+    that is not in the set of completed (todo_id, date) pairs.
+    """
+    for row in series:
+        for day in occurrences(parse_rule(row.recurrence), row.due_date.date(), first_day, end_day):
+            if (row.id, day) not in completed:
+                yield row, day
@@ -0,0 +1,66 @@
+from datetime import datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+from .recurrence import parse_rule, occurrences
+
+# When due-date reminders go out. A todo falls due at the start of its due
+# date in its author's timezone, and is reminded REMINDER_LEAD before that.
+# The moment is stored on the todo (todos.next_reminder_at, in UTC) whenever
+# its due date, status, rule or its author's timezone changes, so the
+# reminder job only has to read the rows whose moment has come.
+
+REMINDER_LEAD = timedelta(days=1)
+DEFAULT_TIMEZONE = 'UTC'
+
+@lru_cache(maxsize=1)
+def timezone_names():
+    """Every IANA timezone name available here, sorted."""
+    return sorted(available_timezones())
+
+def user_zone(name):
+    """The ZoneInfo for a stored timezone name, UTC when it is missing or unknown."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+def as_utc(moment):
+    """An offset-aware UTC datetime, for a naive one read back from SQLite or an aware one."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+def due_moment(day, zone):
+    """The start of day in zone, in UTC."""
+    return datetime.combine(day, time(), tzinfo=zone).astimezone(timezone.utc)
+
+def reminded_day(reminder_at, zone):
+    """The due date a reminder scheduled for reminder_at is about."""
+    return (as_utc(reminder_at) + REMINDER_LEAD).astimezone(zone).date()
+
+def next_reminder_at(due_date, status, recurrence, zone_name, completed=(), after=None, now=None):
+    """
+    When the next reminder of a todo is due, in UTC, or None if it needs none.
+
+    Only a pending todo with a due date still ahead is reminded; for a
+    repeating one that is its first occurrence still ahead that is not in
+    completed (a set of dates) and not before after.
+    """
+    if status != 'pending' or due_date is None:
+        return None
+    zone = user_zone(zone_name)
+    now = now or datetime.now(timezone.utc)
+    start = due_date.date() if isinstance(due_date, datetime) else due_date
+    # A day is still ahead once its start is: from tomorrow in the user's timezone
+    first = now.astimezone(zone).date() + timedelta(days=1)
+    if after is not None:
+        first = max(first, after)
+
+    if recurrence:
+        days = occurrences(parse_rule(recurrence), start, window_start=first)
+    else:
+        days = (start,) if start >= first else ()
+    for day in days:
+        if day not in completed:
+            return due_moment(day, zone) - REMINDER_LEAD
+    return None
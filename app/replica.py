@@ -0,0 +1,62 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import current_app, g
+from flask_login import current_user
+from extensions import db
+from .database import install_sqlite_pragmas
+from .models import User
+from .reminders import as_utc
+
+# Read replica routing. With REPLICA_DATABASE_URL set, the 'replica' bind
+# answers the queries of views marked @read_only; extensions.RoutingSession
+# picks the engine per statement. A user whose todos changed within the last
+# REPLICA_STICKY_SECONDS keeps reading the primary, so their own changes show
+# up whatever the replica's lag. Everything else, the scheduled jobs and the
+# CLI included, always uses the primary.
+
+def replica_configured(app):
+    return 'replica' in app.config['SQLALCHEMY_BINDS']
+
+def recently_changed(user):
+    """Whether the user's todos changed so recently that the replica may not have the change yet."""
+    if not user.is_authenticated:
+        return False
+    # Read from the primary (the request is not routed yet) rather than from
+    # the user cache, which may predate a change made through another worker
+    modified = db.session.execute(
+        db.select(User.todos_modified_at).filter(User.id == user.id)
+    ).scalar_one()
+    window = timedelta(seconds=current_app.config['REPLICA_STICKY_SECONDS'])
+    return datetime.now(timezone.utc) - as_utc(modified) < window
+
+def read_only(view):
+    """
+    Mark a view as only reading, so its queries may go to the replica. Put
+    it below @login_required: the user is loaded from the primary first.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = replica_configured(current_app) and not recently_changed(current_user)
+        return view(*args, **kwargs)
+    return wrapper
+
+def copy_sqlite_database(source_path, target_path):
+    """
+    Copy a SQLite database file with the online backup API, which takes a
+    consistent snapshot while the source is in use.
+    """
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+def init_app(app):
+    if not replica_configured(app):
+        return
+    with app.app_context():
+        # A SQLite replica is a copy the app must never write to by mistake
+        install_sqlite_pragmas(db.engines['replica'], {'query_only': 'ON'})
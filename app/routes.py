@@ -1,14 +1,33 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, current_app
-from .models import User, Todo
-from extensions import db, mail
-from .forms import RegistrationForm, LoginForm, RequestResetForm, ResetPasswordForm, TodoForm
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, current_app, Response, stream_with_context, get_template_attribute
+from .models import User, Todo, ArchivedTodo, RecurrenceException
+from .recurrence import day_window, open_occurrences, parse_rule, describe_rule
+from extensions import db
+from .forms import RegistrationForm, LoginForm, RequestResetForm, ResetPasswordForm, TodoForm, ImportForm, SettingsForm
+from .mailqueue import enqueue_email
+from .search import search_todos
+from .transfer import EXPORT_FORMATS, EXPORT_WRITERS, export_records, import_format, import_todos
+from .queries import (
+    dashboard_todos, calendar_todos, recurring_todos, completed_occurrences, completed_todos, archived_todos,
+    completed_by_month, todos_by_tag, tag_counts, keyset_page
+)
+from .passwords import hash_password, verify_password, needs_rehash
+from .cache import cached_fragment, cached_json
+from .replica import read_only
+from .api import caught_up_cursor
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_mail import Message
+from werkzeug.http import is_resource_modified
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timezone
+import hashlib
 
 main_bp = Blueprint('main_bp', __name__)
 
+PRIORITY_COLORS = {
+    'high': '#dc3545',
+    'medium': '#ffc107',
+    'low': '#17a2b8',
+}
+
 @main_bp.route('/')
 def index():
     return render_template("index.html")
@@ -30,14 +49,19 @@ def signup():
         email = form.email.data
         password = form.password.data
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
 
         new_user = User(username=username, email=email, password=hashed_password)
         db.session.add(new_user)
-        db.session.commit()
-
-        flash(f'Account created for {username}!', 'success')
-        return redirect(url_for('main_bp.signin'))
+        try:
+            # A single INSERT: the unique indexes catch a taken username or email
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            form.add_duplicate_errors(e)
+        else:
+            flash(f'Account created for {username}!', 'success')
+            return redirect(url_for('main_bp.signin'))
 
     return render_template('signup.html', form=form)
 
@@ -53,13 +77,13 @@ def signin():
         password = form.password.data
         remember_me = form.remember_me.data
 
-        user = db.session.execute(
-            db.select(User).filter(
-                (User.username == username_or_email) | (User.email == username_or_email)
-            )
-        ).scalar_one_or_none()
+        user = User.find_by_login(username_or_email)
 
-        if user and check_password_hash(user.password, password):
+        if user and verify_password(user.password, password):
+            if needs_rehash(user.password):
+                # Hashed with older parameters: store it again with the current ones
+                user.password = hash_password(password)
+                db.session.commit()
             login_user(user, remember=remember_me)
             flash('Login successful!', 'success')
             next_page = request.args.get('next')
@@ -80,13 +104,51 @@ def logout():
 
 @main_bp.route('/dashboard')
 @login_required
+@read_only
 def user_dashboard():
+    after, before = request.args.get('after'), request.args.get('before')
+
+    def render():
+        page = keyset_page(
+            dashboard_todos(current_user.id),
+            per_page=current_app.config['TODOS_PER_PAGE'],
+            after=after,
+            before=before
+        )
+        return render_template('_dashboard.html', todos=page.items, page=page)
+
+    content = cached_fragment('dashboard', (after, before), render)
+    return render_template('user_dashboard.html', content=content, sync_cursor=caught_up_cursor())
+
+@main_bp.route('/dashboard/items')
+@login_required
+@read_only
+def dashboard_items():
+    """Dashboard rows of the given pending todos, rendered for live_todos.js to patch in."""
+    ids = [int(todo_id) for todo_id in request.args.get('ids', '').split(',') if todo_id.isdigit()]
     todos = db.session.execute(
-        db.select(Todo)
-        .filter(Todo.author == current_user, Todo.status != 'complete')
-        .order_by(Todo.created_at.desc())
-    ).scalars().all()
-    return render_template('user_dashboard.html', todos=todos)
+        dashboard_todos(current_user.id).filter(Todo.id.in_(ids[:current_app.config['API_BATCH_MAX_ITEMS']]))
+    ).scalars()
+    todo_item = get_template_attribute('_todo_item.html', 'todo_item')
+    return jsonify({'items': {todo.id: str(todo_item(todo)) for todo in todos}})
+
+# --- Settings Routes ---
+
+@main_bp.route('/settings', methods=['GET', 'POST'])
+@login_required
+def settings():
+    form = SettingsForm()
+    if form.validate_on_submit():
+        if form.timezone.data != current_user.timezone:
+            current_user.timezone = form.timezone.data
+            # Due dates now start at another moment, and so do their reminders
+            Todo.reschedule_reminders(current_user.id, current_user.timezone)
+        db.session.commit()
+        flash('Your settings have been saved.', 'success')
+        return redirect(url_for('main_bp.settings'))
+    elif request.method == 'GET':
+        form.timezone.data = current_user.timezone
+    return render_template('settings.html', title='Settings', form=form)
 
 # --- Password Reset Routes ---
 
@@ -96,19 +158,19 @@ def reset_request():
         return redirect(url_for('main_bp.user_dashboard'))
     form = RequestResetForm()
     if form.validate_on_submit():
-        user = db.session.execute(db.select(User).filter_by(email=form.email.data)).scalar_one_or_none()
+        user = form.user
         if user:
             token = user.get_reset_token()
-            msg = Message(
+            enqueue_email(
                 'Password Reset Request',
-                sender=current_app.config['MAIL_DEFAULT_SENDER'],
-                recipients=[user.email]
-            )
-            msg.body = f'''To reset your password, visit the following link:
+                recipients=[user.email],
+                body=f'''To reset your password, visit the following link:
 {url_for('main_bp.reset_token', token=token, _external=True)}
 If you did not make this request then simply ignore this email and no changes will be made.
 '''
-            mail.send(msg)
+            )
+            # Stores the token and queues the email in one transaction
+            db.session.commit()
             flash('An email has been sent with instructions to reset your password.', 'info')
         else:
             flash('No account found with that email address.', 'danger')
@@ -125,7 +187,7 @@ def reset_token(token):
         return redirect(url_for('main_bp.reset_request'))
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = generate_password_hash(form.password.data)
+        hashed_password = hash_password(form.password.data)
         user.password = hashed_password
         user.reset_token = None
         user.reset_token_expiration = None
@@ -144,12 +206,15 @@ def new_todo():
         todo = Todo(
             description=form.description.data,
             due_date=form.due_date.data,
-            status=form.status.data,
-            tags=form.tags.data,
             priority=form.priority.data,
-            author=current_user
+            recurrence=form.recurrence.data,
+            user_id=current_user.id
         )
+        todo.set_status(form.status.data)
+        todo.set_tags(form.tags.data)
+        todo.schedule_reminder(current_user.timezone)
         db.session.add(todo)
+        current_user.touch_todos()
         db.session.commit()
         flash('Your to-do has been created!', 'success')
         return redirect(url_for('main_bp.user_dashboard'))
@@ -168,9 +233,15 @@ def update_todo(todo_id):
     if form.validate_on_submit():
         todo.description = form.description.data
         todo.due_date = form.due_date.data
-        todo.status = form.status.data
-        todo.tags = form.tags.data
+        if form.recurrence.data != todo.recurrence:
+            # Completed occurrences belong to the old rule
+            RecurrenceException.forget([todo.id])
+            todo.recurrence = form.recurrence.data
+        todo.set_status(form.status.data)
+        todo.set_tags(form.tags.data)
         todo.priority = form.priority.data
+        todo.schedule_reminder(current_user.timezone)
+        current_user.touch_todos()
         db.session.commit()
         flash('Your to-do has been updated!', 'success')
         return redirect(url_for('main_bp.user_dashboard'))
@@ -180,6 +251,7 @@ def update_todo(todo_id):
         form.status.data = todo.status
         form.tags.data = todo.tags
         form.priority.data = todo.priority
+        form.recurrence.data = todo.recurrence
     return render_template('create_todo.html', title='Update To-do', form=form)
 
 @main_bp.route('/todo/<int:todo_id>/delete', methods=['POST'])
@@ -191,7 +263,8 @@ def delete_todo(todo_id):
     if todo.author != current_user:
         abort(403)
 
-    db.session.delete(todo)
+    todo.delete()
+    current_user.touch_todos()
     db.session.commit()
     flash('Your to-do has been deleted!', 'success')
     return redirect(url_for('main_bp.user_dashboard'))
@@ -205,7 +278,24 @@ def complete_todo(todo_id):
     if todo.author != current_user:
         abort(403)
 
-    todo.status = 'complete'
+    if todo.recurrence and todo.status == 'pending':
+        # Completes the next occurrence; the series stays pending until it runs out
+        occurrence = todo.next_occurrence()
+        if occurrence is not None:
+            todo.complete_occurrence(occurrence)
+        else:
+            todo.set_status('complete')  # The series ran out before this was completed
+        current_user.touch_todos()
+        db.session.commit()
+        if todo.status == 'complete':
+            flash('Task marked as complete; it does not repeat any more.', 'success')
+        else:
+            flash(f'Completed the occurrence due on {occurrence.isoformat()}; '
+                  f'next one on {todo.next_occurrence().isoformat()}.', 'success')
+        return redirect(url_for('main_bp.user_dashboard'))
+
+    todo.set_status('complete')
+    current_user.touch_todos()
     db.session.commit()
     flash('Task marked as complete.', 'success')
     return redirect(url_for('main_bp.user_dashboard'))
@@ -215,78 +305,254 @@ def complete_todo(todo_id):
 @main_bp.route('/calendar')
 @login_required
 def calendar_view():
-    return render_template('calendar.html', title='Calendar View')
+    return render_template(
+        'calendar.html',
+        title='Calendar View',
+        sync_cursor=caught_up_cursor(),
+        priority_colors=PRIORITY_COLORS
+    )
+
+def parse_calendar_bound(value):
+    """
+    Parse a FullCalendar `start`/`end` parameter into a naive datetime.
+
+    Due dates are stored as naive calendar dates, so the wall-clock part of the
+    bound is kept and its UTC offset dropped. Returns None when absent.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        abort(400)
 
 @main_bp.route('/api/todos_calendar')
 @login_required
+@read_only
 def todos_calendar_api():
-    todos = db.session.execute(
-        db.select(Todo)
-        .filter(Todo.author == current_user, Todo.status != 'complete')
-        .order_by(Todo.due_date.asc())
-    ).scalars().all()
-
-    events = []
-    for todo in todos:
-        if todo.due_date:
-            event_color = '#3788d8'
-            if todo.priority == 'high':
-                event_color = '#dc3545'
-            elif todo.priority == 'medium':
-                event_color = '#ffc107'
-            elif todo.priority == 'low':
-                event_color = '#17a2b8'
-
-            events.append({
-                'id': todo.id,
-                'title': todo.description,
-                'start': todo.due_date.isoformat(),
-                'allDay': True,
-                'url': url_for('main_bp.update_todo', todo_id=todo.id),
-                'color': event_color,
-                'extendedProps': {
-                    'status': todo.status,
-                    'tags': todo.tags,
-                    'priority': todo.priority
+    window_start = parse_calendar_bound(request.args.get('start'))
+    window_end = parse_calendar_bound(request.args.get('end'))
+
+    # Answer revalidations from the user row alone, before touching the todos table
+    last_modified = current_user.todos_last_modified
+    etag = hashlib.sha1(
+        f'{current_user.id}|{last_modified.isoformat()}|{window_start}|{window_end}'.encode()
+    ).hexdigest()
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        def build_events():
+            todos = db.session.execute(
+                calendar_todos(current_user.id, window_start, window_end)
+            ).all()
+
+            # Build the edit URL once and fill in the id per row
+            update_url = url_for('main_bp.update_todo', todo_id=0).replace('/0/', '/{}/')
+            events = []
+            for todo in todos:
+                events.append({
+                    'id': todo.id,
+                    'title': todo.description,
+                    'start': todo.due_date.isoformat(),
+                    'allDay': True,
+                    'url': update_url.format(todo.id),
+                    'color': PRIORITY_COLORS.get(todo.priority, '#3788d8'),
+                    'extendedProps': {
+                        'status': todo.status,
+                        'tags': todo.tags,
+                        'priority': todo.priority
+                    }
+                })
+
+            # Repeating todos: one event per open occurrence, expanded for this window only
+            first_day, end_day = day_window(window_start, window_end, current_app.config['RECURRENCE_MAX_DAYS'])
+            series = db.session.execute(
+                recurring_todos(current_user.id, datetime.combine(end_day, datetime.min.time()))
+            ).all()
+            completed = set()
+            if series:
+                completed = {
+                    (row.todo_id, row.occurrence) for row in db.session.execute(
+                        completed_occurrences([todo.id for todo in series], first_day, end_day)
+                    )
                 }
-            })
-    return jsonify(events)
+            for todo, day in open_occurrences(series, first_day, end_day, completed):
+                events.append({
+                    'id': f'{todo.id}:{day.isoformat()}',
+                    'groupId': str(todo.id),
+                    'title': todo.description,
+                    'start': day.isoformat(),
+                    'allDay': True,
+                    'url': update_url.format(todo.id),
+                    'color': PRIORITY_COLORS.get(todo.priority, '#3788d8'),
+                    'extendedProps': {
+                        'status': todo.status,
+                        'tags': todo.tags,
+                        'priority': todo.priority,
+                        'recurrence': describe_rule(parse_rule(todo.recurrence))
+                    }
+                })
+            return events
+
+        response = cached_json('calendar', (window_start, window_end), build_events)
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Let the browser keep the feed but revalidate it on every calendar navigation
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# --- Tag Routes ---
+
+@main_bp.route('/tags')
+@login_required
+@read_only
+def tags_overview():
+    counts = db.session.execute(tag_counts(current_user.id)).all()
+    return render_template('tags.html', title='Tags', tag_counts=counts)
+
+@main_bp.route('/tags/<tag_name>')
+@login_required
+@read_only
+def tagged_todos(tag_name):
+    page = keyset_page(
+        todos_by_tag(current_user.id, tag_name.lower()),
+        per_page=current_app.config['TODOS_PER_PAGE'],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return render_template('todos_by_tag.html', title=f'Tag: {tag_name}', tag_name=tag_name.lower(), todos=page.items, page=page)
+
+@main_bp.route('/api/tags')
+@login_required
+@read_only
+def tags_api():
+    def build():
+        counts = db.session.execute(tag_counts(current_user.id)).all()
+        return [{'name': name, 'count': count} for name, count in counts]
+    return cached_json('tags', (), build)
+
+@main_bp.route('/api/tags/<tag_name>/todos')
+@login_required
+@read_only
+def tagged_todos_api(tag_name):
+    page = keyset_page(
+        todos_by_tag(current_user.id, tag_name.lower()),
+        per_page=current_app.config['TODOS_PER_PAGE'],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return jsonify({
+        'todos': [todo.to_dict() for todo in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    })
+
+# --- Search Routes ---
+
+@main_bp.route('/search')
+@login_required
+@read_only
+def search():
+    query = request.args.get('q', '').strip()
+    results = search_todos(current_user.id, query, current_app.config['SEARCH_RESULTS_LIMIT'])
+    return render_template('search.html', title='Search', query=query, todos=results)
+
+@main_bp.route('/api/search')
+@login_required
+@read_only
+def search_api():
+    query = request.args.get('q', '').strip()
+    results = search_todos(current_user.id, query, current_app.config['SEARCH_RESULTS_LIMIT'])
+    return jsonify([todo.to_dict() for todo in results])
+
+# --- Import/Export Routes ---
+
+@main_bp.route('/todos/export.<fmt>')
+@login_required
+def export_todos(fmt):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    records = export_records(current_user.id, current_app.config['EXPORT_BATCH_SIZE'])
+    # Streamed: the body is generated while the client downloads it
+    return Response(
+        stream_with_context(EXPORT_WRITERS[fmt](records)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=todos.{fmt}'}
+    )
+
+@main_bp.route('/todos/import', methods=['GET', 'POST'])
+@login_required
+def import_todos_view():
+    form = ImportForm()
+    stats = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        stats = import_todos(
+            current_user,
+            upload.stream,
+            import_format(upload.filename),
+            current_app.config['IMPORT_CHUNK_SIZE']
+        )
+        category = 'success' if stats['imported'] and not stats['errors'] else 'warning'
+        flash(f"Imported {stats['imported']} to-dos, skipped {stats['invalid']} invalid records.", category)
+    return render_template('import_todos.html', title='Import and Export', form=form, stats=stats)
 
 # --- Completed Todos History Routes ---
 
 @main_bp.route('/completed_todos')
 @login_required
+@read_only
 def completed_todos_history():
-    completed_todos = db.session.execute(
-        db.select(Todo).filter_by(author=current_user, status='complete').order_by(Todo.created_at.desc())
-    ).scalars().all()
+    after, before = request.args.get('after'), request.args.get('before')
+
+    def render():
+        # Recent completions are still in todos, older ones in todos_archive
+        page = keyset_page(
+            [completed_todos(current_user.id), archived_todos(current_user.id)],
+            per_page=current_app.config['TODOS_PER_PAGE'],
+            after=after,
+            before=before
+        )
 
-    total_completed = len(completed_todos)
-    completed_by_month = {}
-    for todo in completed_todos:
-        if todo.created_at:
-            month_year = todo.created_at.strftime('%Y-%m')
-            completed_by_month[month_year] = completed_by_month.get(month_year, 0) + 1
+        # Maintained counters: one indexed range read instead of a scan of the history
+        by_month = dict(db.session.execute(completed_by_month(current_user.id)).all())
+        total_completed = sum(by_month.values())
 
-    return render_template(
-        'completed_todos.html',
-        title='Completed To-dos History',
-        completed_todos=completed_todos,
-        total_completed=total_completed,
-        completed_by_month=completed_by_month
-    )
+        return render_template(
+            '_completed_todos.html',
+            completed_todos=page.items,
+            page=page,
+            total_completed=total_completed,
+            completed_by_month=by_month
+        )
+
+    content = cached_fragment('completed', (after, before), render)
+    return render_template('completed_todos.html', title='Completed To-dos History', content=content)
 
 @main_bp.route('/todo/<int:todo_id>/restore', methods=['POST'])
 @login_required
 def restore_todo(todo_id):
     todo = db.session.get(Todo, todo_id)
     if todo is None:
-        abort(404)
+        archived = db.session.get(ArchivedTodo, todo_id)
+        if archived is None:
+            abort(404)
+        if archived.user_id != current_user.id:
+            abort(403)
+        archived.restore()
+        current_user.touch_todos()
+        db.session.commit()
+        flash('To-do item restored successfully!', 'success')
+        return redirect(url_for('main_bp.completed_todos_history'))
     if todo.author != current_user:
         abort(403)
 
     if todo.status == 'complete':
-        todo.status = 'pending'
+        todo.set_status('pending')
+        todo.schedule_reminder(current_user.timezone)
+        current_user.touch_todos()
         db.session.commit()
         flash('To-do item restored successfully!', 'success')
     else:
@@ -0,0 +1,91 @@
+import atexit
+
+# The periodic jobs. Only processes started with SCHEDULER_ENABLED (or running
+# `flask run-scheduler`) run them; web workers and one-off CLI commands never
+# import APScheduler or start its thread.
+
+# The background scheduler of this process, once started
+_scheduler = None
+
+def add_jobs(scheduler, app):
+    """Register every periodic job of app on an APScheduler scheduler."""
+    from .tasks import send_due_date_reminders, prune_tombstones, archive_completed_todos
+    from .mailqueue import drain_outbox
+    from .leases import run_exclusive
+    from .metrics import instrument_job
+
+    # Several processes may still run a scheduler (a deploy overlapping the
+    # old one, say), so each job only proceeds in the one holding its lease.
+    scheduler.add_job(
+        func=lambda: run_exclusive(
+            # Another process takes over within two polls if the holder dies
+            app, 'due_date_reminders', 2 * app.config['REMINDER_POLL_SECONDS'],
+            instrument_job('due_date_reminders', send_due_date_reminders)
+        ),
+        trigger='interval',
+        seconds=app.config['REMINDER_POLL_SECONDS'],
+        id='due_date_reminders',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    scheduler.add_job(
+        func=lambda: run_exclusive(
+            app, 'mail_outbox', app.config['MAIL_QUEUE_LEASE_SECONDS'],
+            instrument_job('mail_outbox', drain_outbox)
+        ),
+        trigger='interval',
+        seconds=app.config['MAIL_QUEUE_POLL_SECONDS'],
+        id='mail_outbox',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    scheduler.add_job(
+        func=lambda: run_exclusive(
+            app, 'prune_tombstones', app.config['REMINDER_LEASE_SECONDS'],  # Daily
+            instrument_job('prune_tombstones', prune_tombstones)
+        ),
+        trigger='cron',
+        hour=3,
+        minute=30,
+        id='prune_tombstones',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        func=lambda: run_exclusive(
+            app, 'archive_todos', app.config['REMINDER_LEASE_SECONDS'],  # Daily
+            instrument_job('archive_todos', archive_completed_todos)
+        ),
+        trigger='cron',
+        hour=2,
+        minute=0,
+        id='archive_todos',
+        replace_existing=True
+    )
+
+def start_background_scheduler(app):
+    """Run the jobs in a background thread of this process; only the first app created starts it."""
+    global _scheduler
+    if _scheduler is not None:
+        return
+    from apscheduler.schedulers.background import BackgroundScheduler
+    _scheduler = BackgroundScheduler()
+    add_jobs(_scheduler, app)
+    _scheduler.start()
+
+    # Ensure the scheduler shuts down when the app exits
+    atexit.register(lambda: _scheduler.shutdown())
+
+    app.logger.info("APScheduler started with the reminder, outbox, tombstone and archive jobs.")
+
+def run_blocking_scheduler(app):
+    """Run the jobs in the foreground until interrupted, for a dedicated scheduler process."""
+    from apscheduler.schedulers.blocking import BlockingScheduler
+    scheduler = BlockingScheduler()
+    add_jobs(scheduler, app)
+    app.logger.info("APScheduler running the reminder, outbox, tombstone and archive jobs.")
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
@@ -0,0 +1,68 @@
+import re
+from extensions import db
+from .models import Todo
+
+# Full-text search over todo descriptions and tags.
+#
+# SQLite uses the contentless todos_fts FTS5 table, kept in sync with todos by triggers;
+# PostgreSQL uses a GIN index over a tsvector expression. Both are created by
+# the migration that introduced search. Other databases fall back to LIKE.
+
+# Must match the expression of the ix_todos_search GIN index exactly
+POSTGRES_DOCUMENT = (
+    "to_tsvector('english'::regconfig, "
+    "coalesce(todos.description, '') || ' ' || coalesce(todos.tags, ''))"
+)
+
+SEARCH_TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+def search_terms(query):
+    """Words of a user query, with anything FTS would treat as syntax dropped."""
+    return SEARCH_TERM_PATTERN.findall(query or '')
+
+def fts5_query(user_id, terms):
+    """
+    Every term must match the description or tags, the last one as a prefix
+    so results follow typing; the owner column keeps it to one user's todos.
+    """
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return f'owner : "u{user_id}" AND {{description tags}} : ({" ".join(quoted)})'
+
+def search_todos(user_id, query, limit):
+    """The user's todos matching a free-text query, best match first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        stmt = db.select(Todo).from_statement(
+            db.text(
+                'SELECT todos.* FROM todos_fts '
+                'JOIN todos ON todos.id = todos_fts.rowid '
+                'WHERE todos_fts MATCH :match '
+                'ORDER BY todos_fts.rank LIMIT :limit'
+            ).bindparams(match=fts5_query(user_id, terms), limit=limit)
+        )
+    elif dialect == 'postgresql':
+        tsquery = "websearch_to_tsquery('english'::regconfig, :query)"
+        stmt = db.select(Todo).from_statement(
+            db.text(
+                f'SELECT todos.* FROM todos '
+                f'WHERE {POSTGRES_DOCUMENT} @@ {tsquery} AND todos.user_id = :user_id '
+                f'ORDER BY ts_rank({POSTGRES_DOCUMENT}, {tsquery}) DESC LIMIT :limit'
+            ).bindparams(query=' '.join(terms), user_id=user_id, limit=limit)
+        )
+    else:
+        conditions = [
+            Todo.description.ilike(f'%{term}%') | Todo.tags.ilike(f'%{term}%') for term in terms
+        ]
+        stmt = (
+            db.select(Todo)
+            .filter(Todo.user_id == user_id, *conditions)
+            .order_by(Todo.created_at.desc())
+            .limit(limit)
+        )
+
+    return db.session.execute(stmt.options(db.selectinload(Todo.tag_objects))).scalars().all()
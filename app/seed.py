@@ -0,0 +1,78 @@
+import random
+from datetime import datetime, timedelta, timezone
+from extensions import db
+from .models import User, Todo
+
+# Synthetic data for load tests and benchmarks. The shapes follow what real
+# accounts look like: most todos are recent, about a third are done, many
+# have a due date clustered in the coming weeks, and a few tags are far more
+# popular than the rest.
+
+PRIORITY_WEIGHTS = {'low': 30, 'medium': 50, 'high': 20}
+TAG_VOCABULARY = [
+    'work', 'home', 'errands', 'health', 'finance', 'family', 'urgent', 'reading',
+    'travel', 'garden', 'car', 'school', 'shopping', 'fitness', 'music', 'cooking',
+    'taxes', 'kids', 'pets', 'friends', 'projects', 'learning', 'cleaning', 'bills',
+    'writing', 'photos', 'volunteering', 'repairs', 'birthday', 'someday',
+]
+VERBS = ['Call', 'Email', 'Buy', 'Fix', 'Review', 'Plan', 'Book', 'Pay', 'Clean', 'Write', 'Schedule', 'Return']
+OBJECTS = [
+    'the dentist', 'groceries', 'the quarterly report', 'the bike', 'flights', 'the electricity bill',
+    'the garage', 'thank-you notes', 'a haircut', 'the library books', 'the team', 'car insurance',
+]
+COMPLETE_SHARE = 0.35
+DUE_DATE_SHARE = 0.7
+
+def random_tags(rng):
+    # Zipf-like popularity: the first tags of the vocabulary dominate
+    count = rng.choices([0, 1, 2, 3], weights=[30, 40, 20, 10])[0]
+    weights = [1 / rank for rank in range(1, len(TAG_VOCABULARY) + 1)]
+    return ', '.join(dict.fromkeys(rng.choices(TAG_VOCABULARY, weights=weights, k=count)))
+
+def random_todo(rng, now):
+    """Field values for one synthetic todo, in the shape Todo.insert_many takes."""
+    created_at = now - timedelta(days=rng.expovariate(1 / 60) % 365, seconds=rng.randrange(86400))
+    status = 'complete' if rng.random() < COMPLETE_SHARE else 'pending'
+    values = {
+        'description': f'{rng.choice(VERBS)} {rng.choice(OBJECTS)}',
+        'status': status,
+        'priority': rng.choices(list(PRIORITY_WEIGHTS), weights=list(PRIORITY_WEIGHTS.values()))[0],
+        'tags': random_tags(rng),
+        'created_at': created_at,
+        'due_date': None,
+    }
+    if rng.random() < DUE_DATE_SHARE:
+        # Mostly the next few weeks, some overdue
+        values['due_date'] = (now + timedelta(days=rng.gauss(10, 20))).date()
+    if status == 'complete':
+        values['completed_at'] = created_at + (now - created_at) * rng.random()
+    return values
+
+def seed_data(user_count, todos_per_user, password_hash, prefix='user', seed=None, commit_every=5000):
+    """
+    Create user_count users with todos_per_user todos each and return the new user ids.
+
+    Users are named {prefix}{n}, numbered after the users already using the
+    prefix, and all share password_hash (hashing is too slow to do per user).
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    start = db.session.scalar(
+        db.select(db.func.count()).select_from(User).filter(User.username_lower.like(f'{prefix.casefold()}%'))
+    )
+    user_ids = []
+    pending = 0
+    for number in range(start + 1, start + user_count + 1):
+        user = User(username=f'{prefix}{number}', email=f'{prefix}{number}@example.com', password=password_hash)
+        db.session.add(user)
+        db.session.flush()
+        user_ids.append(user.id)
+        if todos_per_user:
+            Todo.insert_many(user.id, [random_todo(rng, now) for _ in range(todos_per_user)])
+            user.touch_todos()
+        pending += todos_per_user + 1
+        if pending >= commit_every:
+            db.session.commit()
+            pending = 0
+    db.session.commit()
+    return user_ids
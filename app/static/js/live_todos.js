@@ -0,0 +1,216 @@
+/*
+ * Live updates for the dashboard and the calendar.
+ *
+ * The server sends a "todos" Server-Sent Event whenever the user's to-dos
+ * change (see app/events.py). Each event, and each (re)connection, makes the
+ * page fetch /api/v1/todos/changes from its last cursor and apply just those
+ * changes. Entries are applied by id, so receiving one twice does no harm.
+ */
+
+function watchTodoChanges(options) {
+  // options: eventsUrl, changesUrl, cursor, apply(changes) returning an optional promise
+  var cursor = options.cursor;
+  var syncing = false;
+  var again = false;
+
+  function fetchChanges(since, changes) {
+    return fetch(options.changesUrl + "?since=" + encodeURIComponent(since), {
+      credentials: "same-origin",
+      headers: { Accept: "application/json" },
+    })
+      .then(function (response) {
+        if (response.status === 410) {
+          // Away for longer than deletions are remembered: start over
+          window.location.reload();
+        }
+        if (!response.ok) {
+          throw new Error("Fetching changes failed with status " + response.status);
+        }
+        return response.json();
+      })
+      .then(function (page) {
+        changes = changes.concat(page.changes);
+        if (page.has_more) {
+          return fetchChanges(page.next_cursor, changes);
+        }
+        return { changes: changes, cursor: page.next_cursor };
+      });
+  }
+
+  function sync() {
+    if (syncing) {
+      again = true;
+      return;
+    }
+    syncing = true;
+    fetchChanges(cursor, [])
+      .then(function (result) {
+        return Promise.resolve(result.changes.length && options.apply(result.changes)).then(function () {
+          // Only move on once the page shows the changes
+          cursor = result.cursor;
+        });
+      })
+      .catch(function (error) {
+        console.warn(error);
+      })
+      .finally(function () {
+        syncing = false;
+        if (again) {
+          again = false;
+          sync();
+        }
+      });
+  }
+
+  if (!window.EventSource) {
+    return;
+  }
+  var source = new EventSource(options.eventsUrl);
+  source.addEventListener("todos", sync);
+  // Events sent while the stream was down are lost, so catch up on every (re)connection
+  source.addEventListener("open", sync);
+}
+
+function latestChanges(changes) {
+  // The last entry per id wins
+  var latest = {};
+  changes.forEach(function (change) {
+    latest[change.id] = change;
+  });
+  return Object.keys(latest).map(function (id) {
+    return latest[id];
+  });
+}
+
+function isPending(change) {
+  return !change.deleted && change.status === "pending";
+}
+
+/* Dashboard: rows of pending to-dos, newest first, one page at a time. */
+function patchDashboard(list, itemsUrl, changes) {
+  var empty = document.getElementById("todo-list-empty");
+  var rows = function () {
+    return list.querySelectorAll("[data-todo-id]");
+  };
+  var rowOf = function (id) {
+    return list.querySelector('[data-todo-id="' + id + '"]');
+  };
+
+  function belongsOnPage(createdAt) {
+    // Only to-dos that sort between this page's first and last row are shown here
+    var all = rows();
+    var firstPage = list.dataset.firstPage === "true";
+    var lastPage = list.dataset.lastPage === "true";
+    if (!all.length) {
+      return firstPage && lastPage;
+    }
+    return (
+      (firstPage || createdAt <= all[0].dataset.createdAt) &&
+      (lastPage || createdAt >= all[all.length - 1].dataset.createdAt)
+    );
+  }
+
+  function insert(row) {
+    var createdAt = row.dataset.createdAt;
+    var next = Array.prototype.find.call(rows(), function (other) {
+      return other.dataset.createdAt < createdAt;
+    });
+    list.insertBefore(row, next || null);
+  }
+
+  function showEmpty() {
+    empty.hidden = rows().length > 0;
+  }
+
+  var wanted = [];
+  latestChanges(changes).forEach(function (change) {
+    var row = rowOf(change.id);
+    if (!isPending(change)) {
+      if (row) {
+        row.remove();
+      }
+    } else if (row || belongsOnPage(change.created_at)) {
+      wanted.push(change.id);
+    }
+  });
+  if (!wanted.length) {
+    showEmpty();
+    return;
+  }
+
+  // Rows are rendered by the server so they match the rest of the page
+  return fetch(itemsUrl + "?ids=" + wanted.join(","), { credentials: "same-origin" })
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error("Fetching rows failed with status " + response.status);
+      }
+      return response.json();
+    })
+    .then(function (data) {
+      wanted.forEach(function (id) {
+        var row = rowOf(id);
+        if (!data.items[id]) {
+          // Completed or deleted since the changes were read; the next event says so
+          if (row) {
+            row.remove();
+          }
+          return;
+        }
+        var template = document.createElement("template");
+        template.innerHTML = data.items[id].trim();
+        var fresh = template.content.firstElementChild;
+        if (row) {
+          row.replaceWith(fresh);
+        } else {
+          insert(fresh);
+        }
+      });
+      showEmpty();
+    });
+}
+
+/* Calendar: pending to-dos with a due date, as FullCalendar events. */
+function patchCalendar(calendar, options, changes) {
+  // options: updateUrl (with 0 in place of the id), colors by priority
+  var source = calendar.getEventSources()[0];
+  var refetch = false;
+  latestChanges(changes).forEach(function (change) {
+    // Occurrences of a repeating to-do are expanded by the server, so the
+    // feed is fetched again rather than patched
+    var repeating = calendar.getEvents().some(function (event) {
+      return event.groupId === String(change.id);
+    });
+    if (change.recurrence || repeating) {
+      refetch = true;
+      return;
+    }
+    var event = calendar.getEventById(String(change.id));
+    if (event) {
+      event.remove();
+    }
+    if (!isPending(change) || !change.due_date) {
+      return;
+    }
+    // Same shape as the events of /api/todos_calendar, in the feed's own source
+    // so the next refetch replaces rather than duplicates it
+    calendar.addEvent(
+      {
+        id: String(change.id),
+        title: change.description,
+        start: change.due_date,
+        allDay: true,
+        url: options.updateUrl.replace("/0/", "/" + change.id + "/"),
+        color: options.colors[change.priority] || "#3788d8",
+        extendedProps: {
+          status: change.status,
+          tags: change.tags.join(", ") || null,
+          priority: change.priority,
+        },
+      },
+      source
+    );
+  });
+  if (refetch) {
+    calendar.refetchEvents();
+  }
+}
@@ -1,67 +1,238 @@
-from datetime import datetime, timedelta, timezone
-from flask_mail import Message
-from flask import current_app, url_for
-from extensions import db, mail
-from .models import Todo, User
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from itertools import groupby, islice
+from operator import attrgetter
+from flask import url_for
+from extensions import db
+from .mailqueue import enqueue_email
+from .models import User, Todo, TodoTombstone, ArchivedTodo, RecurrenceException, todo_tags
+from .queries import due_reminders, completed_occurrences, archivable_todos
+from .reminders import user_zone, due_moment, reminded_day, next_reminder_at
 
-def send_due_date_reminders(app):
+def iter_in_chunks(stmt, chunk_size):
     """
-    Sends email reminders for tasks due within the next 24 hours.
-    This function runs in a background thread via APScheduler.
+    Yield the rows of a statement ordered by (user_id, id) chunk_size at a time.
+
+    Each chunk is its own bounded query resuming after the last row of the
+    previous one, so no cursor is held open between chunks and memory stays
+    flat whatever the number of rows.
     """
-    with app.app_context():
-        now_utc = datetime.now(timezone.utc)
-        reminder_window_start = now_utc
-        reminder_window_end = now_utc + timedelta(days=1)
-
-        # Query for todos that are pending and have a due_date within the reminder window
-        todos_due_soon = db.session.execute(
-            db.select(Todo).filter(
-                Todo.status == 'pending',
-                Todo.due_date.isnot(None),
-                Todo.due_date >= reminder_window_start,
-                Todo.due_date < reminder_window_end
+    stmt = stmt.limit(chunk_size)
+    last_key = None
+    while True:
+        chunk_stmt = stmt
+        if last_key is not None:
+            # Spelled out rather than as a row-value comparison, which SQLite
+            # would answer by walking a user_id index from last_key onwards
+            # instead of keeping to the statement's own range
+            last_user_id, last_id = last_key
+            chunk_stmt = stmt.filter(
+                db.or_(Todo.user_id > last_user_id, db.and_(Todo.user_id == last_user_id, Todo.id > last_id))
             )
-        ).scalars().all()
-
-        if not todos_due_soon:
-            app.logger.info("No pending todos due in the next 24 hours found for reminders.")
+        rows = db.session.execute(chunk_stmt).all()
+        yield from rows
+        if len(rows) < chunk_size:
             return
+        last_key = (rows[-1].user_id, rows[-1].id)
+
+# A todo whose reminder came due: due_date is the day it is about (for a
+# repeating todo, the occurrence), expired tells whether that day has already
+# started (the job did not run for a while), and next_at is when the todo is
+# to be reminded next
+Reminder = namedtuple(
+    'Reminder', 'id user_id description due_date status tags priority username email expired next_at'
+)
+
+def iter_due_reminders(now, chunk_size):
+    """
+    Yield a Reminder for each pending todo whose next reminder is due at or
+    before now, chunk_size rows at a time, ordered by (user_id, id).
+    """
+    rows = iter_in_chunks(due_reminders(now), chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        repeating = [row.id for row in chunk if row.recurrence]
+        completed = {}
+        if repeating:
+            # Occurrences completed ahead of time are skipped when rescheduling;
+            # a day before today in UTC is before today in every timezone
+            for row in db.session.execute(
+                completed_occurrences(repeating, now.date() - timedelta(days=1), date.max)
+            ):
+                completed.setdefault(row.todo_id, set()).add(row.occurrence)
+
+        for row in chunk:
+            zone = user_zone(row.timezone)
+            day = reminded_day(row.next_reminder_at, zone)
+            yield Reminder(
+                row.id, row.user_id, row.description, datetime.combine(day, datetime.min.time()), row.status,
+                row.tags, row.priority, row.username, row.email,
+                expired=due_moment(day, zone) <= now,
+                next_at=next_reminder_at(
+                    row.due_date, row.status, row.recurrence, row.timezone,
+                    completed.get(row.id, ()), after=day + timedelta(days=1), now=now
+                )
+            )
 
-        app.logger.info(f"Found {len(todos_due_soon)} todos due soon. Sending reminders...")
-
-        for todo in todos_due_soon:
-            user = todo.author  # Access the associated user via the relationship
-            if user and user.email:
-                try:
-                    msg = Message(
-                        subject=f'Reminder: Your To-do "{todo.description}" is due soon!',
-                        sender=current_app.config['MAIL_DEFAULT_SENDER'],
-                        recipients=[user.email]
-                    )
-                    due_date_str = todo.due_date.strftime('%Y-%m-%d') if todo.due_date else 'N/A'
-                    msg.body = f'''
+def build_reminder_digest(todos, dashboard_url):
+    """Subject and body of one email listing every todo of a single user that is due soon."""
+    # Every row carries the author's columns from the join
+    user = todos[0]
+    if len(todos) == 1:
+        subject = f'Reminder: Your To-do "{todos[0].description}" is due soon!'
+    else:
+        subject = f'Reminder: {len(todos)} of your To-dos are due soon!'
+
+    items = []
+    for todo in todos:
+        due_date_str = todo.due_date.strftime('%Y-%m-%d') if todo.due_date else 'N/A'
+        items.append(f'''- "{todo.description}" is due on {due_date_str}.
+  Priority: {todo.priority.capitalize()}
+  Status: {todo.status.capitalize()}
+  Tags: {todo.tags if todo.tags else 'None'}''')
+    item_list = '\n\n'.join(items)
+
+    body = f'''
 Hello {user.username},
 
-This is a friendly reminder that your to-do item:
-"{todo.description}"
-is due on {due_date_str}.
+This is a friendly reminder that the following to-do items are due soon:
 
-Priority: {todo.priority.capitalize()}
-Status: {todo.status.capitalize()}
-Tags: {todo.tags if todo.tags else 'None'}
+{item_list}
 
-Don't forget to complete it!
+Don't forget to complete them!
 
 You can view and manage your tasks here:
-{url_for('main_bp.user_dashboard', _external=True)}
+{dashboard_url}
 
 Best regards,
 Your To-do App Team
 '''
-                    mail.send(msg)
-                    app.logger.info(f"Reminder sent for todo ID {todo.id} to {user.email}")
-                except Exception as e:
-                    app.logger.error(f"Failed to send reminder for todo ID {todo.id} to {user.email}: {e}")
-            else:
-                app.logger.warning(f"Could not send reminder for todo ID {todo.id}: User or email not found.")
\ No newline at end of file
+    return subject, body
+
+def send_due_date_reminders(app):
+    """
+    Queues one digest email per user listing their tasks that fall due soon.
+    This function runs every few minutes in a background thread via APScheduler.
+
+    Each todo carries the moment its next reminder is due (next_reminder_at,
+    see app/reminders.py), so a run only reads the rows that came due since
+    the previous one, through an index range scan, with their author joined
+    in and grouped per user. Each digest goes into the outbox (see
+    app/mailqueue.py) in the same transaction that moves its todos'
+    next_reminder_at on (to the next occurrence of a repeating todo, else to
+    None), so a run that is interrupted and started again only queues what
+    is still missing, and the job never waits on the SMTP server. Todos whose
+    due date started before they could be reminded are rescheduled without
+    an email. Returns the statistics that are also logged at the end.
+    """
+    with app.app_context():
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+
+        stats = {'todos': 0, 'digests': 0, 'skipped': 0, 'expired': 0}
+        dashboard_url = url_for('main_bp.user_dashboard', _external=True)
+        batch_size = app.config['REMINDER_BATCH_SIZE']
+        next_times = {}
+
+        def commit_queued():
+            Todo.set_reminder_times(next_times)
+            db.session.commit()
+            next_times.clear()
+
+        for user_id, user_rows in groupby(iter_due_reminders(now, batch_size), key=attrgetter('user_id')):
+            reminders = list(user_rows)
+            next_times.update((reminder.id, reminder.next_at) for reminder in reminders)
+            todos = [reminder for reminder in reminders if not reminder.expired]
+            stats['expired'] += len(reminders) - len(todos)
+            stats['todos'] += len(todos)
+
+            if todos and not todos[0].email:
+                stats['skipped'] += 1
+                app.logger.warning(f"Could not send reminders for user ID {user_id}: email not found.")
+            elif todos:
+                subject, body = build_reminder_digest(todos, dashboard_url)
+                enqueue_email(subject, [todos[0].email], body)
+                stats['digests'] += 1
+
+            if len(next_times) >= batch_size:
+                commit_queued()
+
+        if next_times:
+            commit_queued()
+
+        stats['elapsed_seconds'] = round(time.monotonic() - started, 3)
+        stats['digests_per_second'] = round(stats['digests'] / stats['elapsed_seconds'], 1) if stats['elapsed_seconds'] else 0.0
+
+        if stats['todos'] == 0 and stats['expired'] == 0:
+            # Most runs find nothing, so this stays out of the info log
+            app.logger.debug("No todos came due for a reminder.")
+        else:
+            app.logger.info(
+                f"Reminders: {stats['todos']} todos in {stats['digests']} digests queued, "
+                f"{stats['skipped']} skipped, {stats['expired']} expired in {stats['elapsed_seconds']}s "
+                f"({stats['digests_per_second']} digests/s)."
+            )
+        return stats
+
+def prune_tombstones(app):
+    """
+    Deletes the tombstones of todos deleted more than SYNC_TOMBSTONE_DAYS ago.
+    Sync cursors that old are refused, so no client can still need them.
+    Runs daily in a background thread via APScheduler.
+    """
+    with app.app_context():
+        cutoff = datetime.now(timezone.utc) - timedelta(days=app.config['SYNC_TOMBSTONE_DAYS'])
+        result = db.session.execute(db.delete(TodoTombstone).where(TodoTombstone.deleted_at < cutoff))
+        db.session.commit()
+        app.logger.info(f"Pruned {result.rowcount} tombstones older than {cutoff:%Y-%m-%d}.")
+        return {'deleted': result.rowcount}
+
+def archive_completed_todos(app):
+    """
+    Moves todos completed more than ARCHIVE_AFTER_DAYS ago from todos to
+    todos_archive, ARCHIVE_BATCH_SIZE at a time with one commit per batch, so
+    the live table and its indexes only hold active work. Runs daily in a
+    background thread via APScheduler. Returns the statistics it logs.
+    """
+    with app.app_context():
+        started = time.monotonic()
+        now_utc = datetime.now(timezone.utc)
+        cutoff = now_utc - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])
+        stats = {'archived': 0, 'batches': 0}
+        columns = ArchivedTodo.COPIED_COLUMNS
+
+        while True:
+            ids = db.session.execute(archivable_todos(cutoff, app.config['ARCHIVE_BATCH_SIZE'])).scalars().all()
+            if not ids:
+                break
+            # Copied and deleted with set-based statements; the rows never become objects
+            db.session.execute(
+                db.insert(ArchivedTodo).from_select(
+                    [*columns, 'archived_at'],
+                    db.select(*(getattr(Todo, column) for column in columns), db.literal(now_utc, db.DateTime(timezone=True)))
+                    .filter(Todo.id.in_(ids))
+                )
+            )
+            db.session.execute(db.delete(todo_tags).where(todo_tags.c.todo_id.in_(ids)))
+            # A finished series no longer needs its completed occurrences
+            RecurrenceException.forget(ids)
+            # Syncing clients and open pages must learn the todos left the live table
+            owners = db.session.execute(db.select(Todo.user_id, Todo.id).filter(Todo.id.in_(ids))).all()
+            for user_id, rows in groupby(sorted(owners), key=attrgetter('user_id')):
+                TodoTombstone.record(user_id, [row.id for row in rows])
+            for user in db.session.execute(db.select(User).filter(User.id.in_({row.user_id for row in owners}))).scalars():
+                user.touch_todos()
+            db.session.execute(
+                db.delete(Todo).where(Todo.id.in_(ids)),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.commit()
+            stats['archived'] += len(ids)
+            stats['batches'] += 1
+
+        stats['elapsed_seconds'] = round(time.monotonic() - started, 3)
+        app.logger.info(
+            f"Archive: {stats['archived']} todos completed before {cutoff:%Y-%m-%d} moved "
+            f"in {stats['batches']} batches, {stats['elapsed_seconds']}s."
+        )
+        return stats
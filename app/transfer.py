@@ -0,0 +1,180 @@
+import csv
+import io
+import json
+from datetime import datetime
+from extensions import db
+from .forms import clean_todo_data
+from .models import Todo, ArchivedTodo
+from .reminders import as_utc
+
+# Bulk export and import of a user's todos, shared by the routes and the CLI.
+# Neither side ever holds more than one batch of todos in memory.
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+EXPORT_FIELDS = (
+    'id', 'description', 'status', 'priority', 'due_date', 'tags', 'recurrence', 'created_at', 'completed_at'
+)
+# Rows serialized before a chunk of the export is handed to the client
+EXPORT_FLUSH_ROWS = 200
+
+def import_format(filename):
+    """The import format for an uploaded file name, or None if it is not supported."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension)
+
+# --- Export ---
+
+def export_records(user_id, batch_size):
+    """
+    Yield every todo of a user, archived ones included, as a dict of EXPORT_FIELDS.
+
+    Rows come from a server-side cursor batch_size at a time. Live todos are
+    read in the order of ix_todos_user_status_created (pending first, then
+    oldest first) and archived ones after them in the order of
+    ix_todos_archive_user_created, so the database needs no sort whatever the
+    size of the history.
+    """
+    live = (
+        db.select(
+            Todo.id, Todo.description, Todo.status, Todo.priority, Todo.due_date,
+            Todo.tags, Todo.recurrence, Todo.created_at, Todo.completed_at
+        )
+        .filter(Todo.user_id == user_id)
+        .order_by(Todo.status, Todo.created_at, Todo.id)
+    )
+    archived = (
+        db.select(
+            ArchivedTodo.id, ArchivedTodo.description, ArchivedTodo.status, ArchivedTodo.priority,
+            ArchivedTodo.due_date, ArchivedTodo.tags, ArchivedTodo.recurrence,
+            ArchivedTodo.created_at, ArchivedTodo.completed_at
+        )
+        .filter(ArchivedTodo.user_id == user_id)
+        .order_by(ArchivedTodo.created_at, ArchivedTodo.id)
+    )
+    for stmt in (live, archived):
+        for row in db.session.execute(stmt.execution_options(yield_per=batch_size)):
+            yield {
+                'id': row.id,
+                'description': row.description,
+                'status': row.status,
+                'priority': row.priority,
+                'due_date': row.due_date.date().isoformat() if row.due_date else None,
+                'tags': row.tags,
+                'recurrence': row.recurrence,
+                'created_at': row.created_at.isoformat(),
+                'completed_at': row.completed_at.isoformat() if row.completed_at else None,
+            }
+
+def iter_csv(records):
+    """Serialize records as CSV with a header row, yielding text in chunks."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for count, record in enumerate(records, 1):
+        writer.writerow(record)
+        if count % EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_ndjson(records):
+    """Serialize records as one JSON object per line, yielding text in chunks."""
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record) + '\n')
+        if len(lines) == EXPORT_FLUSH_ROWS:
+            yield ''.join(lines)
+            lines.clear()
+    yield ''.join(lines)
+
+EXPORT_WRITERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
+
+# --- Import ---
+
+def read_records(stream, fmt):
+    """
+    Parse a binary upload incrementally, yielding (line number, record).
+
+    The record is a dict, or None for an NDJSON line that is not valid JSON.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 timestamp into UTC, taking one without an offset to be
+    UTC already. SQLite drops the offset when storing, so it must be UTC.
+    """
+    return as_utc(datetime.fromisoformat(value))
+
+def clean_import_record(record):
+    """Validate one imported record with TodoForm's rules. Returns (values, errors)."""
+    if not isinstance(record, dict):
+        return {}, {'record': 'Not a valid JSON object.'}
+    # CSV cells are always strings: an empty one means the field was left out
+    record = {key: value for key, value in record.items() if key and value not in ('', None)}
+    values, errors = clean_todo_data(record)
+    # Timestamps from an export are kept so history and monthly counts survive a move
+    for field in ('created_at', 'completed_at'):
+        if field in record:
+            try:
+                values[field] = parse_timestamp(record[field])
+            except (TypeError, ValueError):
+                errors[field] = 'Not a valid ISO 8601 timestamp.'
+    return values, errors
+
+def import_todos(user, stream, fmt, chunk_size, max_errors=100):
+    """
+    Import the todos in an uploaded CSV or NDJSON file for a user.
+
+    Valid records are inserted and committed chunk_size at a time; invalid
+    ones are skipped and reported with their line number (up to max_errors).
+    Returns {'imported', 'invalid', 'errors'}.
+    """
+    stats = {'imported': 0, 'invalid': 0, 'errors': []}
+    chunk = []
+
+    def insert_chunk():
+        Todo.insert_many(user.id, chunk)
+        user.touch_todos()
+        db.session.commit()
+        stats['imported'] += len(chunk)
+        chunk.clear()
+
+    line_number = 0
+    try:
+        for line_number, record in read_records(stream, fmt):
+            values, errors = clean_import_record(record)
+            if errors:
+                stats['invalid'] += 1
+                if len(stats['errors']) < max_errors:
+                    stats['errors'].append({'line': line_number, 'errors': errors})
+                continue
+            chunk.append(values)
+            if len(chunk) >= chunk_size:
+                insert_chunk()
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Everything read before the unreadable part is still imported
+        stats['errors'].append({'line': line_number + 1, 'errors': {'file': f'Could not read the file: {e}'}})
+    if chunk:
+        insert_chunk()
+    return stats
@@ -0,0 +1,234 @@
+"""
+Latency, query count and peak memory of the hot paths at several data sizes.
+
+Each size (USERSxTODOS_PER_USER) gets a fresh SQLite database built by the
+migrations and filled with `seed_data`, in its own process so sizes do not
+share caches or memory. The dashboard, the calendar feed and the completed
+history are requested through the test client as one seeded user; the
+reminder job runs over every user. The page cache is cleared before each
+request unless --warm-cache is given, so the numbers measure the queries and
+templates rather than cache lookups.
+
+The report is JSON; keep one per commit and pass the older one to --compare:
+
+    python benchmarks/hot_paths.py --sizes 10x100,50x1000 --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Metrics --compare prints side by side
+COMPARED = ('p50_ms', 'p95_ms', 'queries', 'peak_memory_kib')
+
+def build_app(path, user_count, todos_per_user, seed):
+    os.environ['DEV_DATABASE_URL'] = f'sqlite:///{path}'
+    from flask_migrate import upgrade
+    from extensions import init_migrate
+    from app import create_app
+    from app.passwords import hash_password
+    from app.seed import seed_data
+
+    app = create_app('development')
+    app.config.update(WTF_CSRF_ENABLED=False, PASSWORD_HASH_WORKERS=0)
+    app.logger.disabled = True
+    init_migrate(app)
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        started = time.perf_counter()
+        seed_data(user_count, todos_per_user, hash_password('password'), prefix='bench', seed=seed)
+        seed_seconds = time.perf_counter() - started
+    return app, seed_seconds
+
+def path_callables(app, warm_cache):
+    """One callable per hot path, each doing a single request or job run."""
+    from extensions import db
+    from app.models import User, Todo, OutboundEmail
+    from app.tasks import send_due_date_reminders
+
+    client = app.test_client()
+    response = client.post('/signin', data={'username_or_email': 'bench1', 'password': 'password'})
+    assert response.status_code == 302, response.status_code
+    page_cache = app.extensions['page_cache']
+    today = date.today()
+    window = {'start': (today - timedelta(days=7)).isoformat(), 'end': (today + timedelta(days=35)).isoformat()}
+
+    def get(url, **params):
+        def request():
+            if not warm_cache:
+                page_cache.clear()
+            response = client.get(url, query_string=params)
+            assert response.status_code == 200, (url, response.status_code)
+        return request
+
+    def reset_reminders():
+        # Every run finds the same due todos: none reminded, no mail queued
+        with app.app_context():
+            for user in db.session.execute(db.select(User)).scalars():
+                Todo.reschedule_reminders(user.id, user.timezone)
+            db.session.execute(db.delete(OutboundEmail))
+            db.session.commit()
+
+    return {
+        'user_dashboard': (get('/dashboard'), None),
+        'todos_calendar_api': (get('/api/todos_calendar', **window), None),
+        'completed_todos_history': (get('/completed_todos'), None),
+        'send_due_date_reminders': (lambda: send_due_date_reminders(app), reset_reminders),
+    }
+
+def count_queries(engine):
+    """A list that collects the statements the current thread sends to engine."""
+    from sqlalchemy import event
+    thread = threading.get_ident()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # The scheduler's jobs run on other threads and are not counted
+        if threading.get_ident() == thread:
+            statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements, lambda: event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def measure(run, reset, iterations, engine):
+    if reset:
+        reset()
+    run()  # Warm up imports, template compilation and the statement cache
+
+    timings = []
+    for _ in range(iterations):
+        if reset:
+            reset()
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+
+    # Queries and memory come from one more run, as tracing slows it down
+    if reset:
+        reset()
+    statements, stop_counting = count_queries(engine)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stop_counting()
+
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p95_ms': round(cuts[94] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+        'queries': len(statements),
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+def measure_size(user_count, todos_per_user, iterations, seed, warm_cache):
+    """Runs in a fresh process: seed a database of this size and measure every path."""
+    with tempfile.TemporaryDirectory() as directory:
+        app, seed_seconds = build_app(os.path.join(directory, 'bench.db'), user_count, todos_per_user, seed)
+        from extensions import db
+        with app.app_context():
+            engine = db.engine
+        results = {}
+        for name, (run, reset) in path_callables(app, warm_cache).items():
+            results[name] = measure(run, reset, iterations, engine)
+        from app.passwords import shutdown
+        shutdown()
+        engine.dispose()
+    return {
+        'users': user_count,
+        'todos_per_user': todos_per_user,
+        'seed_seconds': round(seed_seconds, 2),
+        'paths': results,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_sizes(value):
+    sizes = []
+    for size in value.split(','):
+        users, _, todos = size.lower().partition('x')
+        sizes.append((int(users), int(todos)))
+    return sizes
+
+def compare(report, previous):
+    """Print each compared metric next to the same one in an older report."""
+    before = {
+        (size['users'], size['todos_per_user'], name): metrics
+        for size in previous['sizes'] for name, metrics in size['paths'].items()
+    }
+    print(f"\nCompared with {previous.get('commit') or 'previous report'}:")
+    for size in report['sizes']:
+        for name, metrics in size['paths'].items():
+            old = before.get((size['users'], size['todos_per_user'], name))
+            if old is None:
+                continue
+            changes = []
+            for metric in COMPARED:
+                change = f'{old[metric]} -> {metrics[metric]}'
+                if old[metric]:
+                    change += f' ({(metrics[metric] - old[metric]) / old[metric]:+.0%})'
+                changes.append(f'{metric} {change}')
+            print(f"  {size['users']}x{size['todos_per_user']} {name}: {', '.join(changes)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=parse_sizes, default='10x100,25x1000,50x5000',
+                        help='Comma-separated USERSxTODOS_PER_USER data sizes')
+    parser.add_argument('--iterations', type=int, default=50, help='Timed runs per path and size')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed of the generated data')
+    parser.add_argument('--warm-cache', action='store_true', help='Keep the page cache between requests')
+    parser.add_argument('--output', help='Write the JSON report here instead of standard output')
+    parser.add_argument('--compare', help='An earlier report to compare against')
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'cpus': os.cpu_count(),
+        'iterations': args.iterations,
+        'warm_cache': args.warm_cache,
+        'sizes': [],
+    }
+    for user_count, todos_per_user in args.sizes:
+        print(f'Measuring {user_count} users x {todos_per_user} to-dos...', file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            report['sizes'].append(executor.submit(
+                measure_size, user_count, todos_per_user, args.iterations, args.seed, args.warm_cache
+            ).result())
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(report, json.load(previous))
+
+if __name__ == '__main__':
+    main()
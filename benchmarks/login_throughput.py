@@ -0,0 +1,97 @@
+"""
+Login throughput, and the latency of other requests during a login burst,
+with passwords hashed on the request threads and in the hashing process pool.
+
+Threads share one application the way a threaded worker does: some post to
+/signin in a loop while one keeps requesting a cheap page.
+
+    python benchmarks/login_throughput.py --threads 8 --seconds 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USERS = 20
+
+def build_app(path, hash_workers):
+    os.environ['DEV_DATABASE_URL'] = f'sqlite:///{path}'
+    from app import create_app
+    from extensions import db
+    from app.models import User
+    from app.passwords import hash_password
+
+    app = create_app('development')
+    app.config.update(WTF_CSRF_ENABLED=False, PASSWORD_HASH_WORKERS=hash_workers)
+    app.logger.disabled = True
+    with app.app_context():
+        db.create_all()
+        password = hash_password('password')
+        db.session.add_all(
+            User(username=f'user{n}', email=f'user{n}@example.com', password=password)
+            for n in range(USERS)
+        )
+        db.session.commit()
+    return app
+
+def run(app, args):
+    deadline = time.monotonic() + args.seconds
+    logins, page_latencies = [], []
+
+    def log_in(number):
+        client = app.test_client()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = client.post('/signin', data={'username_or_email': f'user{number % USERS}', 'password': 'password'})
+            assert response.status_code == 302, response.status_code
+            logins.append(time.perf_counter() - started)
+            client.get('/logout')
+
+    def browse():
+        client = app.test_client()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            client.get('/')
+            page_latencies.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=log_in, args=(n,)) for n in range(args.threads)]
+    threads.append(threading.Thread(target=browse))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    page_latencies.sort()
+    return {
+        'logins_per_second': round(len(logins) / args.seconds, 1),
+        'login_p50_ms': round(statistics.median(logins) * 1000, 1),
+        'page_p50_ms': round(statistics.median(page_latencies) * 1000, 1),
+        'page_p99_ms': round(page_latencies[int(len(page_latencies) * 0.99)] * 1000, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='Threads logging in concurrently')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1, help='Size of the hashing pool')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = build_app(os.path.join(directory, 'bench.db'), args.hash_workers)
+        print(f'{args.threads} login threads, {args.seconds:g}s, {os.cpu_count()} CPUs, '
+              f"{app.config['PASSWORD_HASH_METHOD']}")
+        columns = ('mode', 'logins_per_second', 'login_p50_ms', 'page_p50_ms', 'page_p99_ms')
+        print(' '.join(f'{column:>18}' for column in columns))
+        for mode, workers in (('request thread', 0), (f'pool of {args.hash_workers}', args.hash_workers)):
+            app.config['PASSWORD_HASH_WORKERS'] = workers
+            result = {'mode': mode, **run(app, args)}
+            print(' '.join(f'{result[column]:>18}' for column in columns))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Concurrent read/write throughput of SQLite with the default settings and with
+the production PRAGMAs (config.ProductionConfig.SQLITE_PRAGMAS).
+
+Each worker process stands in for a web worker or the scheduler: it loops on
+a mix of dashboard reads and to-do writes against a shared database file and
+records latencies and "database is locked" failures.
+
+    python benchmarks/sqlite_concurrency.py --workers 8 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, exc, insert, select, update  # noqa: E402
+from config import ProductionConfig  # noqa: E402
+from extensions import db  # noqa: E402
+from app.database import install_sqlite_pragmas  # noqa: E402
+from app.models import User, Todo  # noqa: E402
+
+USERS = 50
+PROFILES = {
+    'default': {},
+    'production': ProductionConfig.SQLITE_PRAGMAS,
+}
+
+def make_engine(path, pragmas):
+    engine = create_engine(f'sqlite:///{path}')
+    install_sqlite_pragmas(engine, pragmas)
+    return engine
+
+def prepare(path, pragmas):
+    engine = make_engine(path, pragmas)
+    db.metadata.create_all(engine)
+    now = datetime.now(timezone.utc)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {
+                'username': f'user{n}', 'username_lower': f'user{n}', 'email': f'user{n}@example.com',
+                'email_lower': f'user{n}@example.com', 'password': 'x', 'is_admin': False, 'todos_modified_at': now
+            }
+            for n in range(1, USERS + 1)
+        ])
+        connection.execute(insert(Todo), [
+            {'user_id': n % USERS + 1, 'description': f'todo {n}', 'status': 'pending', 'priority': 'medium', 'created_at': now}
+            for n in range(USERS * 100)
+        ])
+    engine.dispose()
+
+def worker(path, pragmas, seconds, write_ratio, results):
+    engine = make_engine(path, pragmas)
+    reads, writes, errors = [], [], 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        user_id = random.randint(1, USERS)
+        started = time.perf_counter()
+        try:
+            if random.random() < write_ratio:
+                # What new_todo does: insert the todo and bump the owner's modification time
+                now = datetime.now(timezone.utc)
+                with engine.begin() as connection:
+                    connection.execute(insert(Todo).values(
+                        user_id=user_id, description='new', status='pending', priority='medium', created_at=now
+                    ))
+                    connection.execute(update(User).where(User.id == user_id).values(todos_modified_at=now))
+                writes.append(time.perf_counter() - started)
+            else:
+                # The dashboard's first page
+                with engine.connect() as connection:
+                    connection.execute(
+                        select(Todo.id, Todo.description, Todo.created_at)
+                        .filter(Todo.user_id == user_id, Todo.status == 'pending')
+                        .order_by(Todo.created_at.desc(), Todo.id.desc())
+                        .limit(26)
+                    ).all()
+                reads.append(time.perf_counter() - started)
+        except exc.OperationalError:
+            errors += 1
+    engine.dispose()
+    results.put((reads, writes, errors))
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+def run(profile, args):
+    pragmas = PROFILES[profile]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        prepare(path, pragmas)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(path, pragmas, args.seconds, args.write_ratio, results))
+            for _ in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    reads = [latency for r, _, _ in collected for latency in r]
+    writes = [latency for _, w, _ in collected for latency in w]
+    latencies = reads + writes
+    return {
+        'profile': profile,
+        'ops_per_second': round(len(latencies) / args.seconds),
+        'writes_per_second': round(len(writes) / args.seconds),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else 0.0,
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'write_p99_ms': round(percentile(writes, 0.99), 2),
+        'locked_errors': sum(errors for _, _, errors in collected),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f'{args.workers} processes, {args.seconds:g}s each, {args.write_ratio:.0%} writes')
+    columns = ('profile', 'ops_per_second', 'writes_per_second', 'p50_ms', 'p95_ms', 'p99_ms', 'write_p99_ms', 'locked_errors')
+    print(' '.join(f'{column:>17}' for column in columns))
+    for profile in PROFILES:
+        result = run(profile, args)
+        print(' '.join(f'{result[column]:>17}' for column in columns))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Startup cost of the app: import time, create_app and the first request.
+
+Every run starts a fresh interpreter, as a worker or a CLI command would, and
+reports how long `import app`, `create_app()` and one request to the sign-in
+page took, plus the threads left running. A separate `python -X importtime`
+run breaks the import down by the modules `app` imports directly.
+
+Keep a report per commit and compare against the checked-in baseline. The
+script fails when a median got slower by more than --max-regression (25% by
+default); regenerate the baseline with --output when a slowdown is accepted:
+
+    python benchmarks/startup.py --compare benchmarks/startup_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.hot_paths import git_commit
+
+# Metrics --compare prints side by side and --max-regression checks
+COMPARED = ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms')
+# Slowdown of a median, as a fraction, that fails a comparison by default
+MAX_REGRESSION = 0.25
+
+# Runs in the fresh interpreter and prints its timings as JSON
+PROBE = '''
+import json, threading, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app('development')
+created = time.perf_counter()
+response = app.test_client().get('/signin')
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - started) * 1000,
+    'threads': sorted(thread.name for thread in threading.enumerate()),
+}))
+'''
+
+def probe_environment(directory):
+    env = dict(os.environ)
+    env['DEV_DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'startup.db')}"
+    env['PYTHONPATH'] = ROOT
+    return env
+
+def run_probe(env):
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def import_breakdown(env, top):
+    """The cumulative import time of `app` and of the slowest modules it imports directly."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    # Lines are "import time: self | cumulative | name", children before their
+    # parent and indented two spaces per level
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        level = (len(name) - len(name.lstrip())) // 2
+        entries.append((level, name.strip(), int(cumulative) / 1000))
+
+    index = next(i for i, (level, name, _) in enumerate(entries) if level == 0 and name == 'app')
+    children = []
+    for level, name, cumulative_ms in reversed(entries[:index]):
+        if level == 0:
+            break
+        if level == 1:
+            children.append((name, round(cumulative_ms, 1)))
+    children.sort(key=lambda child: child[1], reverse=True)
+    return {'app_ms': round(entries[index][2], 1), 'slowest_imports_ms': dict(children[:top])}
+
+def measure(runs, top):
+    with tempfile.TemporaryDirectory() as directory:
+        env = probe_environment(directory)
+        run_probe(env)  # Warm the bytecode cache, which a deployed app has too
+        samples = [run_probe(env) for _ in range(runs)]
+        breakdown = import_breakdown(env, top)
+    results = {
+        metric: round(statistics.median(sample[metric] for sample in samples), 1)
+        for metric in COMPARED
+    }
+    results['threads'] = samples[-1]['threads']
+    results['importtime'] = breakdown
+    return results
+
+def compare(report, previous, max_regression=None):
+    """Print each compared median next to an older report's; return the metrics that regressed."""
+    print(f"\nCompared with {previous.get('commit') or 'previous report'}:")
+    regressed = []
+    for metric in COMPARED:
+        old, new = previous['results'][metric], report['results'][metric]
+        change = (new - old) / old if old else 0
+        print(f'  {metric}: {old} -> {new} ({change:+.0%})')
+        if max_regression is not None and change > max_regression:
+            regressed.append(metric)
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters to time')
+    parser.add_argument('--top', type=int, default=10, help='Direct imports of app to list')
+    parser.add_argument('--output', help='Write the JSON report here instead of standard output')
+    parser.add_argument('--compare', help='An earlier report to compare against')
+    parser.add_argument('--max-regression', type=float, default=MAX_REGRESSION,
+                        help='With --compare, fail if a median is slower by more than this fraction '
+                             f'(default {MAX_REGRESSION})')
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'runs': args.runs,
+        'results': measure(args.runs, args.top),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as previous:
+            regressed = compare(report, json.load(previous), args.max_regression)
+        if regressed:
+            sys.exit(f"Startup regressed by more than {args.max_regression:.0%}: {', '.join(regressed)}")
+
+if __name__ == '__main__':
+    main()
@@ -7,11 +7,78 @@ def str_to_bool(value):
     """Convert string environment variable to boolean."""
     return str(value).lower() in ('true', '1', 't', 'yes', 'y')
 
+def production_engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS of the production profile for a database URL."""
+    if database_uri.startswith('postgresql'):
+        return {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),  # Connections kept open per process
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 20),  # Extra connections under load
+            'pool_pre_ping': str_to_bool(os.environ.get('DB_POOL_PRE_PING') or 'true'),  # Drop dead connections before use
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 1800),  # Seconds before a connection is replaced
+        }
+    return {}
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'super-secret-key'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     REMEMBER_COOKIE_DURATION = timedelta(days=5)  # Configure remember me cookie duration
 
+    # werkzeug password hash method and cost, e.g. 'scrypt:32768:8:1' (N:r:p) or
+    # 'pbkdf2:sha256:1000000'. Stored hashes are upgraded on the next login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    # Processes hashing passwords off the request threads, per app process (so
+    # a web server with N workers runs N times as many); 0 hashes inline
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+
+    # Number of todos shown per page on the dashboard and history views
+    TODOS_PER_PAGE = int(os.environ.get('TODOS_PER_PAGE') or 25)
+    # Maximum number of ranked results returned by a search
+    SEARCH_RESULTS_LIMIT = int(os.environ.get('SEARCH_RESULTS_LIMIT') or 50)
+
+    # Largest batch accepted by one request to the JSON API
+    API_BATCH_MAX_ITEMS = int(os.environ.get('API_BATCH_MAX_ITEMS') or 500)
+
+    # Delta sync (/api/v1/todos/changes): changes per response, how far behind
+    # the clock a caught-up cursor stays so slow transactions are not missed,
+    # and how long deletions are remembered
+    SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE') or 500)
+    SYNC_CURSOR_LAG_SECONDS = int(os.environ.get('SYNC_CURSOR_LAG_SECONDS') or 5)
+    SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS') or 90)
+
+    # Completed todos move to todos_archive this many days after completion,
+    # in batches of this many per transaction
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 90)
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE') or 500)
+
+    # Repeating todos are expanded for at most this many days per calendar request
+    RECURRENCE_MAX_DAYS = int(os.environ.get('RECURRENCE_MAX_DAYS') or 366)
+
+    # Bulk export/import: rows fetched per cursor batch, todos inserted per commit
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE') or 500)
+
+    # Cache backend: 'local' (per process), 'redis' (shared, needs the redis package)
+    # or 'package.module:Class' for a custom backend
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'local'
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or 'redis://localhost:6379/0'
+    # Users kept by the login identity cache, and for how long. With the local
+    # backend another process may see a changed user for up to the TTL.
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES') or 10000)
+    USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS') or 30)
+    # Rendered todo pages and JSON payloads, keyed by user and todo version
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES') or 2000)
+    PAGE_CACHE_TTL_SECONDS = int(os.environ.get('PAGE_CACHE_TTL_SECONDS') or 3600)
+
+    # Live update events: 'local' (one process), 'redis' (fan-out to every
+    # process, needs the redis package) or 'package.module:Class'
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND') or 'local'
+    EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL') or CACHE_REDIS_URL
+    # Events buffered per open stream, comment lines that keep it alive, and how
+    # long one stream lasts before the browser reconnects (freeing its worker)
+    EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE') or 100)
+    EVENTS_HEARTBEAT_SECONDS = int(os.environ.get('EVENTS_HEARTBEAT_SECONDS') or 15)
+    EVENTS_STREAM_SECONDS = int(os.environ.get('EVENTS_STREAM_SECONDS') or 300)
+
     # Email configuration for password recovery.
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
@@ -20,6 +87,49 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
 
+    # Outbound mail queue: every email is stored in mail_outbox and delivered by a scheduler job
+    MAIL_QUEUE_POLL_SECONDS = int(os.environ.get('MAIL_QUEUE_POLL_SECONDS') or 10)
+    MAIL_QUEUE_BATCH_SIZE = int(os.environ.get('MAIL_QUEUE_BATCH_SIZE') or 100)
+    MAIL_QUEUE_CONCURRENCY = int(os.environ.get('MAIL_QUEUE_CONCURRENCY') or 4)  # Persistent SMTP connections
+    MAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('MAIL_QUEUE_MAX_ATTEMPTS') or 8)
+    MAIL_QUEUE_RETRY_BASE_SECONDS = int(os.environ.get('MAIL_QUEUE_RETRY_BASE_SECONDS') or 30)
+    MAIL_QUEUE_RETRY_MAX_SECONDS = int(os.environ.get('MAIL_QUEUE_RETRY_MAX_SECONDS') or 3600)
+    MAIL_QUEUE_RUN_SECONDS = int(os.environ.get('MAIL_QUEUE_RUN_SECONDS') or 30)  # Time budget of one drain run
+    MAIL_QUEUE_LEASE_SECONDS = int(os.environ.get('MAIL_QUEUE_LEASE_SECONDS') or 60)
+    # Per SMTP socket operation; keep it well under the lease so a stalled server cannot hold a batch past it
+    MAIL_QUEUE_SMTP_TIMEOUT_SECONDS = int(os.environ.get('MAIL_QUEUE_SMTP_TIMEOUT_SECONDS') or 10)
+
+    # Run the periodic jobs (reminders, outbox, pruning, archive) in a background
+    # thread of this process. Turn it on in the one process meant to run them,
+    # or run `flask run-scheduler` instead; web workers and CLI commands leave it off.
+    SCHEDULER_ENABLED = str_to_bool(os.environ.get('SCHEDULER_ENABLED') or 'false')
+
+    # Due-date reminders: how often the job looks for todos that came due, and
+    # todos fetched per query while building digests
+    REMINDER_POLL_SECONDS = int(os.environ.get('REMINDER_POLL_SECONDS') or 300)
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE') or 500)
+    # How long the process that starts a daily job (tombstones, archive) keeps it to itself
+    REMINDER_LEASE_SECONDS = int(os.environ.get('REMINDER_LEASE_SECONDS') or 3600)
+
+    # Request, SQL and job metrics (see app/metrics.py). /metrics is only served
+    # with METRICS_TOKEN set, to scrapers sending "Authorization: Bearer <token>".
+    METRICS_ENABLED = str_to_bool(os.environ.get('METRICS_ENABLED') or 'true')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Add a Server-Timing header (app, db and template time) to every response
+    SERVER_TIMING_HEADER = str_to_bool(os.environ.get('SERVER_TIMING_HEADER') or 'true')
+    # Log statements that take at least this many milliseconds; 0 turns it off
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS') or 0)
+
+    # PRAGMAs run on every new SQLite connection (see app/database.py)
+    SQLITE_PRAGMAS = {}
+
+    # Optional read replica (see app/replica.py): views marked read-only query
+    # it, except for users whose todos changed in the last REPLICA_STICKY_SECONDS.
+    # Keep that window above the replica's worst lag.
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URL} if REPLICA_DATABASE_URL else {}
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS') or 10)
+
     # Flask URL building outside request context
     SERVER_NAME = os.environ.get('SERVER_NAME') or 'localhost:5000'
     PREFERRED_URL_SCHEME = os.environ.get('PREFERRED_URL_SCHEME') or 'http'
@@ -35,6 +145,17 @@ class ProductionConfig(Config):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
                               'sqlite:///' + os.path.join(basedir, 'instance', 'prod.db')  # Fallback, but prod should use a proper DB
+    SQLALCHEMY_ENGINE_OPTIONS = production_engine_options(SQLALCHEMY_DATABASE_URI)
+    # WAL lets readers and the single writer proceed together, and writers wait
+    # for the lock instead of failing with "database is locked".
+    # See benchmarks/sqlite_concurrency.py.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # Durable across application crashes, fsyncs only at checkpoints
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 10000),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024),
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB') or 64 * 1024),  # Negative means KiB
+    }
 
 
 config = {
@@ -1,7 +1,39 @@
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_mail import Mail
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
 
-db = SQLAlchemy()
-migrate = Migrate()
-mail = Mail()
\ No newline at end of file
+class RoutingSession(Session):
+    """
+    Sends the statements of a request marked read-only (see app/replica.py)
+    to the 'replica' bind. Writes stay on the primary, and so does every
+    statement after the request first writes, so it reads what it wrote.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('read_replica'):
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.read_replica = False
+            else:
+                return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Flask-Migrate (which imports Alembic) and Flask-Mail are only needed by the
+# `flask db` commands and the outbox job, so they are set up on first use
+# instead of in create_app, and web requests never import them.
+
+def init_migrate(app):
+    """Set up Flask-Migrate on app, once."""
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        Migrate(app, db, render_as_batch=True)
+
+def mail_state(app):
+    """The app's Flask-Mail state, set up on first use."""
+    state = app.extensions.get('mail')
+    if state is None:
+        from flask_mail import Mail
+        state = Mail().init_app(app)
+    return state
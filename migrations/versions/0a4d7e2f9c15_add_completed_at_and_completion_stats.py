@@ -0,0 +1,52 @@
+"""Add todos.completed_at and per-user monthly completion counters
+
+Revision ID: 0a4d7e2f9c15
+Revises: f2c6a9e3d8b1
+Create Date: 2026-10-18 22:52:26.806441
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a4d7e2f9c15'
+down_revision = 'f2c6a9e3d8b1'
+branch_labels = None
+depends_on = None
+
+MONTH_EXPRESSIONS = {
+    'sqlite': "strftime('%Y-%m', completed_at)",
+    'postgresql': "to_char(completed_at, 'YYYY-MM')",
+    'mysql': "DATE_FORMAT(completed_at, '%Y-%m')",
+}
+
+
+def upgrade():
+    op.create_table('completion_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'month')
+    )
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True))
+
+    # The completion time of existing todos was never recorded; creation time is the best estimate
+    op.execute("UPDATE todos SET completed_at = created_at WHERE status = 'complete'")
+
+    month = MONTH_EXPRESSIONS[op.get_bind().dialect.name]
+    op.execute(
+        f"INSERT INTO completion_stats (user_id, month, count) "
+        f"SELECT user_id, {month}, COUNT(*) FROM todos "
+        f"WHERE status = 'complete' GROUP BY user_id, {month}"
+    )
+
+
+def downgrade():
+    # A plain DROP COLUMN (SQLite >= 3.35) keeps the todos_fts triggers that a
+    # batch table rebuild would drop
+    op.drop_column('todos', 'completed_at')
+
+    op.drop_table('completion_stats')
@@ -0,0 +1,32 @@
+"""Widen users.password for scrypt and future hash parameters
+
+Revision ID: 1b9e5c3f7a20
+Revises: 0a4d7e2f9c15
+Create Date: 2026-10-18 23:14:08.415906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b9e5c3f7a20'
+down_revision = '0a4d7e2f9c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('password',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('password',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=128),
+               existing_nullable=False)
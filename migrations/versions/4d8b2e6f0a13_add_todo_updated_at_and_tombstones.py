@@ -0,0 +1,46 @@
+"""Add todos.updated_at and todo_tombstones for delta sync
+
+Revision ID: 4d8b2e6f0a13
+Revises: 9c3f1a7e5b82
+Create Date: 2026-10-19 09:41:07.314562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d8b2e6f0a13'
+down_revision = '9c3f1a7e5b82'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nullable: NOT NULL without a constant default would need a batch rebuild
+    # of todos, which drops the todos_fts triggers
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+
+    # The last known change of existing todos
+    op.execute("UPDATE todos SET updated_at = COALESCE(completed_at, created_at)")
+    op.create_index('ix_todos_user_updated', 'todos', ['user_id', 'updated_at', 'id'], unique=False)
+
+    op.create_table('todo_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('todo_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_todo_tombstones_user_deleted', 'todo_tombstones', ['user_id', 'deleted_at', 'todo_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_todo_tombstones_user_deleted', table_name='todo_tombstones')
+    op.drop_table('todo_tombstones')
+
+    op.drop_index('ix_todos_user_updated', table_name='todos')
+    # A plain DROP COLUMN keeps the todos_fts triggers, see 0a4d7e2f9c15
+    op.drop_column('todos', 'updated_at')
@@ -0,0 +1,29 @@
+"""Add composite indexes for the hot todo queries
+
+Revision ID: 5c1f0a7d9e21
+Revises: 2b5f320f0bec
+Create Date: 2026-10-18 18:02:11.417305
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f0a7d9e21'
+down_revision = '2b5f320f0bec'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.create_index('ix_todos_user_status_created', ['user_id', 'status', 'created_at'], unique=False)
+        batch_op.create_index('ix_todos_user_status_due', ['user_id', 'status', 'due_date'], unique=False)
+        batch_op.create_index('ix_todos_status_due', ['status', 'due_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.drop_index('ix_todos_status_due')
+        batch_op.drop_index('ix_todos_user_status_due')
+        batch_op.drop_index('ix_todos_user_status_created')
@@ -0,0 +1,62 @@
+"""Add case-folded, uniquely indexed users.username_lower and users.email_lower
+
+Revision ID: 6e2a4c8f1d37
+Revises: 1b9e5c3f7a20
+Create Date: 2026-10-18 23:41:52.093118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2a4c8f1d37'
+down_revision = '1b9e5c3f7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('username_lower', sa.String(length=80), nullable=True))
+        batch_op.add_column(sa.Column('email_lower', sa.String(length=120), nullable=True))
+
+    # Fold in Python: SQL lower() leaves non-ASCII letters alone on SQLite
+    connection = op.get_bind()
+    users = sa.table('users',
+        sa.column('id', sa.Integer),
+        sa.column('username', sa.String),
+        sa.column('email', sa.String),
+        sa.column('username_lower', sa.String),
+        sa.column('email_lower', sa.String),
+    )
+    rows = connection.execute(sa.select(users.c.id, users.c.username, users.c.email)).all()
+    for column in ('username', 'email'):
+        seen = {}
+        for row in rows:
+            folded = getattr(row, column).casefold()
+            if folded in seen:
+                raise RuntimeError(
+                    f'Users {seen[folded]} and {row.id} have the same {column} apart from case; '
+                    f'rename one of them before upgrading.'
+                )
+            seen[folded] = row.id
+    if rows:
+        connection.execute(
+            users.update().where(users.c.id == sa.bindparam('user_id')),
+            [{'user_id': row.id, 'username_lower': row.username.casefold(), 'email_lower': row.email.casefold()} for row in rows]
+        )
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('username_lower', existing_type=sa.String(length=80), nullable=False)
+        batch_op.alter_column('email_lower', existing_type=sa.String(length=120), nullable=False)
+        batch_op.create_index(batch_op.f('ix_users_username_lower'), ['username_lower'], unique=True)
+        batch_op.create_index(batch_op.f('ix_users_email_lower'), ['email_lower'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_email_lower'))
+        batch_op.drop_index(batch_op.f('ix_users_username_lower'))
+        batch_op.drop_column('email_lower')
+        batch_op.drop_column('username_lower')
@@ -0,0 +1,40 @@
+"""Add todos_archive for completed todos moved out of todos
+
+Revision ID: 7f1c3a9d5e24
+Revises: 4d8b2e6f0a13
+Create Date: 2026-10-19 11:03:52.608214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f1c3a9d5e24'
+down_revision = '4d8b2e6f0a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('todos_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(length=200), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('due_date', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('tags', sa.String(length=255), nullable=True),
+    sa.Column('priority', sa.String(length=20), nullable=False),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_todos_archive_user_created', 'todos_archive', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_todos_archive_user_created', table_name='todos_archive')
+    op.drop_table('todos_archive')
@@ -0,0 +1,27 @@
+"""Extend the (user_id, status, created_at) index with id for keyset pagination
+
+Revision ID: 8d4e2b6c3a10
+Revises: 5c1f0a7d9e21
+Create Date: 2026-10-18 18:40:52.090114
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4e2b6c3a10'
+down_revision = '5c1f0a7d9e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.drop_index('ix_todos_user_status_created')
+        batch_op.create_index('ix_todos_user_status_created', ['user_id', 'status', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.drop_index('ix_todos_user_status_created')
+        batch_op.create_index('ix_todos_user_status_created', ['user_id', 'status', 'created_at'], unique=False)
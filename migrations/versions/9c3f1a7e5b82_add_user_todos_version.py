@@ -0,0 +1,29 @@
+"""Add users.todos_version keying the cached todo pages
+
+Revision ID: 9c3f1a7e5b82
+Revises: 6e2a4c8f1d37
+Create Date: 2026-10-19 00:12:37.551204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3f1a7e5b82'
+down_revision = '6e2a4c8f1d37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('todos_version', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('todos_version', existing_type=sa.Integer(), server_default=None)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('todos_version')
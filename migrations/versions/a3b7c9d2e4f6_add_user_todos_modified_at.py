@@ -0,0 +1,31 @@
+"""Add users.todos_modified_at for conditional GETs on the todo APIs
+
+Revision ID: a3b7c9d2e4f6
+Revises: 8d4e2b6c3a10
+Create Date: 2026-10-18 19:15:37.602448
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3b7c9d2e4f6'
+down_revision = '8d4e2b6c3a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('todos_modified_at', sa.DateTime(timezone=True), nullable=True))
+
+    op.execute(sa.text('UPDATE users SET todos_modified_at = CURRENT_TIMESTAMP'))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('todos_modified_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('todos_modified_at')
@@ -0,0 +1,45 @@
+"""Add todos.recurrence and recurrence_exceptions for repeating todos
+
+Revision ID: b8e4d1f7c2a6
+Revises: 7f1c3a9d5e24
+Create Date: 2026-10-19 14:26:38.917350
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e4d1f7c2a6'
+down_revision = '7f1c3a9d5e24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('recurrence', sa.String(length=100), nullable=True))
+
+    # Partial: one-off todos, nearly all of them, stay out of this index
+    op.create_index(
+        'ix_todos_recurring', 'todos', ['status', 'user_id', 'due_date', 'id'], unique=False,
+        sqlite_where=sa.text('recurrence IS NOT NULL'), postgresql_where=sa.text('recurrence IS NOT NULL')
+    )
+    op.add_column('todos_archive', sa.Column('recurrence', sa.String(length=100), nullable=True))
+
+    op.create_table('recurrence_exceptions',
+    sa.Column('todo_id', sa.Integer(), nullable=False),
+    sa.Column('occurrence', sa.Date(), nullable=False),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['todo_id'], ['todos.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('todo_id', 'occurrence')
+    )
+
+
+def downgrade():
+    op.drop_table('recurrence_exceptions')
+
+    op.drop_column('todos_archive', 'recurrence')
+    op.drop_index('ix_todos_recurring', table_name='todos')
+    # A plain DROP COLUMN keeps the todos_fts triggers, see 0a4d7e2f9c15
+    op.drop_column('todos', 'recurrence')
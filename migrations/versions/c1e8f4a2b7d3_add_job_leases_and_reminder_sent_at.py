@@ -0,0 +1,34 @@
+"""Add job_leases table and todos.reminder_sent_at
+
+Revision ID: c1e8f4a2b7d3
+Revises: a3b7c9d2e4f6
+Create Date: 2026-10-18 20:05:48.331920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1e8f4a2b7d3'
+down_revision = 'a3b7c9d2e4f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_leases',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('owner', sa.String(length=100), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reminder_sent_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.drop_column('reminder_sent_at')
+
+    op.drop_table('job_leases')
@@ -0,0 +1,70 @@
+"""Add users.timezone and todos.next_reminder_at for reminders in local time
+
+Revision ID: c9f3e6a1d5b8
+Revises: b8e4d1f7c2a6
+Create Date: 2026-10-19 17:42:09.204716
+
+"""
+from datetime import datetime, timedelta, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f3e6a1d5b8'
+down_revision = 'b8e4d1f7c2a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('timezone', sa.String(length=64), nullable=False, server_default='UTC'))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('timezone', existing_type=sa.String(length=64), server_default=None)
+
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_reminder_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_todos_next_reminder', 'todos', ['next_reminder_at'], unique=False)
+
+    # Every user starts out in UTC, where a due date starts at its stored
+    # midnight, so a one-off todo not reminded yet is due a reminder a day
+    # before that. Repeating todos need their rule expanded: run
+    # `flask reschedule-reminders` after upgrading to schedule them.
+    connection = op.get_bind()
+    todos = sa.table('todos',
+        sa.column('id', sa.Integer),
+        sa.column('status', sa.String),
+        sa.column('due_date', sa.DateTime),
+        sa.column('recurrence', sa.String),
+        sa.column('reminder_sent_at', sa.DateTime(timezone=True)),
+        sa.column('next_reminder_at', sa.DateTime(timezone=True)),
+    )
+    now = datetime.now(timezone.utc)
+    rows = connection.execute(
+        sa.select(todos.c.id, todos.c.due_date)
+        .where(
+            todos.c.status == 'pending',
+            todos.c.due_date > now.replace(tzinfo=None),
+            todos.c.recurrence.is_(None),
+            todos.c.reminder_sent_at.is_(None)
+        )
+    ).all()
+    if rows:
+        connection.execute(
+            todos.update().where(todos.c.id == sa.bindparam('todo_id')),
+            [
+                {'todo_id': row.id, 'next_reminder_at': row.due_date.replace(tzinfo=timezone.utc) - timedelta(days=1)}
+                for row in rows
+            ]
+        )
+
+
+def downgrade():
+    op.drop_index('ix_todos_next_reminder', table_name='todos')
+    # A plain DROP COLUMN keeps the todos_fts triggers, see 0a4d7e2f9c15
+    op.drop_column('todos', 'next_reminder_at')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('timezone')
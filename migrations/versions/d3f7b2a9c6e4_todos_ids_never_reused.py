@@ -0,0 +1,81 @@
+"""Never reuse todo ids on SQLite (AUTOINCREMENT), so archived ids stay unique
+
+Without AUTOINCREMENT SQLite hands out max(id) + 1, which falls back below
+the archived ids once the newest live todos are deleted. The table is
+rebuilt with AUTOINCREMENT and its sequence starts past both todos and
+todos_archive. The rebuild drops the full-text search triggers, which are
+created again. PostgreSQL sequences never go back, so it is left alone.
+
+Revision ID: d3f7b2a9c6e4
+Revises: c9f3e6a1d5b8
+Create Date: 2026-10-20 09:14:52.381027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f7b2a9c6e4'
+down_revision = 'c9f3e6a1d5b8'
+branch_labels = None
+depends_on = None
+
+# As created by f2c6a9e3d8b1
+FTS_TRIGGERS = [
+    """CREATE TRIGGER todos_fts_ai AFTER INSERT ON todos BEGIN
+        INSERT INTO todos_fts(rowid, description, tags, owner)
+        VALUES (new.id, new.description, new.tags, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER todos_fts_ad AFTER DELETE ON todos BEGIN
+        INSERT INTO todos_fts(todos_fts, rowid, description, tags, owner)
+        VALUES ('delete', old.id, old.description, old.tags, 'u' || old.user_id);
+    END""",
+    """CREATE TRIGGER todos_fts_au AFTER UPDATE OF description, tags, user_id ON todos BEGIN
+        INSERT INTO todos_fts(todos_fts, rowid, description, tags, owner)
+        VALUES ('delete', old.id, old.description, old.tags, 'u' || old.user_id);
+        INSERT INTO todos_fts(rowid, description, tags, owner)
+        VALUES (new.id, new.description, new.tags, 'u' || new.user_id);
+    END""",
+]
+
+DROP_FTS_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS todos_fts_au",
+    "DROP TRIGGER IF EXISTS todos_fts_ad",
+    "DROP TRIGGER IF EXISTS todos_fts_ai",
+]
+
+
+def rebuild_todos(autoincrement):
+    for statement in DROP_FTS_TRIGGERS:
+        op.execute(statement)
+    # The partial index is recreated by hand: reflection may drop its WHERE
+    op.drop_index('ix_todos_recurring', table_name='todos')
+    # Nothing changes but the table options, which only a rebuild applies
+    with op.batch_alter_table('todos', recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+    op.create_index(
+        'ix_todos_recurring', 'todos', ['status', 'user_id', 'due_date', 'id'], unique=False,
+        sqlite_where=sa.text('recurrence IS NOT NULL')
+    )
+    for statement in FTS_TRIGGERS:
+        op.execute(statement)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild_todos(autoincrement=True)
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'todos'")
+    op.execute(
+        """INSERT INTO sqlite_sequence (name, seq) SELECT 'todos', max(
+            (SELECT coalesce(max(id), 0) FROM todos),
+            (SELECT coalesce(max(id), 0) FROM todos_archive)
+        )"""
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild_todos(autoincrement=False)
@@ -0,0 +1,26 @@
+"""Drop todos.reminder_sent_at, replaced by next_reminder_at
+
+Revision ID: e5c1a8d4f2b7
+Revises: d3f7b2a9c6e4
+Create Date: 2026-10-20 10:02:37.640915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c1a8d4f2b7'
+down_revision = 'd3f7b2a9c6e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A plain DROP COLUMN: a batch rebuild of todos would drop the search triggers
+    op.drop_column('todos', 'reminder_sent_at')
+
+
+def downgrade():
+    with op.batch_alter_table('todos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reminder_sent_at', sa.DateTime(timezone=True), nullable=True))
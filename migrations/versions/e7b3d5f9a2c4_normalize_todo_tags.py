@@ -0,0 +1,91 @@
+"""Normalize todo tags into tags and todo_tags, backfilled from todos.tags
+
+Revision ID: e7b3d5f9a2c4
+Revises: d6a2f8c4e1b9
+Create Date: 2026-10-18 21:27:04.118652
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3d5f9a2c4'
+down_revision = 'd6a2f8c4e1b9'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def parse_tags(text):
+    # Frozen copy of app.models.parse_tags at the time of this migration
+    names = []
+    for part in (text or '').split(','):
+        name = ' '.join(part.split()).lower()[:50]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def upgrade():
+    op.create_table('tags',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'name', name='uq_tags_user_name')
+    )
+    op.create_table('todo_tags',
+    sa.Column('todo_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['todo_id'], ['todos.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('todo_id', 'tag_id')
+    )
+    with op.batch_alter_table('todo_tags', schema=None) as batch_op:
+        batch_op.create_index('ix_todo_tags_tag_todo', ['tag_id', 'todo_id'], unique=False)
+
+    # Backfill from the comma-separated strings, a batch of todos at a time
+    todos = sa.table('todos', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer), sa.column('tags', sa.String))
+    tags = sa.table('tags', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer), sa.column('name', sa.String))
+    todo_tags = sa.table('todo_tags', sa.column('todo_id', sa.Integer), sa.column('tag_id', sa.Integer))
+
+    bind = op.get_bind()
+    tag_ids = {}  # (user_id, name) -> tag id
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(todos.c.id, todos.c.user_id, todos.c.tags)
+            .where(todos.c.id > last_id, todos.c.tags.isnot(None), todos.c.tags != '')
+            .order_by(todos.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        links = []
+        for todo_id, user_id, text in rows:
+            names = parse_tags(text)
+            for name in names:
+                key = (user_id, name)
+                if key not in tag_ids:
+                    tag_ids[key] = bind.execute(
+                        tags.insert().values(user_id=user_id, name=name).returning(tags.c.id)
+                    ).scalar_one()
+                links.append({'todo_id': todo_id, 'tag_id': tag_ids[key]})
+            bind.execute(
+                todos.update().where(todos.c.id == todo_id).values(tags=', '.join(names) or None)
+            )
+        if links:
+            bind.execute(todo_tags.insert(), links)
+
+
+def downgrade():
+    with op.batch_alter_table('todo_tags', schema=None) as batch_op:
+        batch_op.drop_index('ix_todo_tags_tag_todo')
+
+    op.drop_table('todo_tags')
+    op.drop_table('tags')
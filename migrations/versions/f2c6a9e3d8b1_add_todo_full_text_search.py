@@ -0,0 +1,81 @@
+"""Add full-text search over todo descriptions and tags
+
+SQLite gets a contentless FTS5 table kept in sync by triggers;
+PostgreSQL gets a GIN index over a tsvector expression (see app/search.py).
+
+Note: SQLite batch migrations that recreate the todos table drop these
+triggers, so such migrations must recreate them afterwards.
+
+Revision ID: f2c6a9e3d8b1
+Revises: e7b3d5f9a2c4
+Create Date: 2026-10-18 22:10:39.574210
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a9e3d8b1'
+down_revision = 'e7b3d5f9a2c4'
+branch_labels = None
+depends_on = None
+
+# The index is contentless: results are joined back to todos by rowid. The
+# owner column holds 'u<user_id>' so a search is narrowed to one user inside
+# FTS5 itself, and is weighted 0 so it never affects ranking.
+SQLITE_UPGRADE = [
+    """CREATE VIRTUAL TABLE todos_fts USING fts5(
+        description, tags, owner,
+        content='',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    "INSERT INTO todos_fts(todos_fts, rank) VALUES ('rank', 'bm25(1.0, 0.5, 0.0)')",
+    """CREATE TRIGGER todos_fts_ai AFTER INSERT ON todos BEGIN
+        INSERT INTO todos_fts(rowid, description, tags, owner)
+        VALUES (new.id, new.description, new.tags, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER todos_fts_ad AFTER DELETE ON todos BEGIN
+        INSERT INTO todos_fts(todos_fts, rowid, description, tags, owner)
+        VALUES ('delete', old.id, old.description, old.tags, 'u' || old.user_id);
+    END""",
+    """CREATE TRIGGER todos_fts_au AFTER UPDATE OF description, tags, user_id ON todos BEGIN
+        INSERT INTO todos_fts(todos_fts, rowid, description, tags, owner)
+        VALUES ('delete', old.id, old.description, old.tags, 'u' || old.user_id);
+        INSERT INTO todos_fts(rowid, description, tags, owner)
+        VALUES (new.id, new.description, new.tags, 'u' || new.user_id);
+    END""",
+    """INSERT INTO todos_fts(rowid, description, tags, owner)
+        SELECT id, description, tags, 'u' || user_id FROM todos""",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS todos_fts_au",
+    "DROP TRIGGER IF EXISTS todos_fts_ad",
+    "DROP TRIGGER IF EXISTS todos_fts_ai",
+    "DROP TABLE IF EXISTS todos_fts",
+]
+
+POSTGRES_UPGRADE = [
+    """CREATE INDEX ix_todos_search ON todos USING GIN (
+        to_tsvector('english'::regconfig, coalesce(description, '') || ' ' || coalesce(tags, ''))
+    )""",
+]
+
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_todos_search",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    statements = {'sqlite': SQLITE_UPGRADE, 'postgresql': POSTGRES_UPGRADE}.get(dialect, [])
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    statements = {'sqlite': SQLITE_DOWNGRADE, 'postgresql': POSTGRES_DOWNGRADE}.get(dialect, [])
+    for statement in statements:
+        op.execute(statement)